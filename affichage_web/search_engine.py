@@ -0,0 +1,125 @@
+"""
+Moteur de recherche persistant : chargé une seule fois par processus (au démarrage de Django,
+cf. web_patients.apps.PatientsConfig.ready) puis interrogé directement par les vues.
+Il garde en mémoire l'index, la matrice tf-idf des documents, le modèle BM25, l'arbre de décision ESMO,
+la table des interactions médicament-gène et les catégories de gènes.
+Les classements déjà calculés sont servis par le cache de requêtes (pertinence/query_cache.py).
+warm_up le charge dans un thread en arrière-plan, avec les ressources NLTK, sans bloquer le démarrage.
+"""
+
+import os
+import sys
+import threading
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT_DIR)
+
+from indexation.compact_index import load_index, INDEX_PATH
+from pertinence.pertinence_vectorielle import TfidfMatrix, rank_documents_vectoriel
+from pertinence.pertinence_proba import BM25, rank_documents_bm25
+from pertinence.pertinence_phrase import phrase_boosts
+from pertinence.pertinence_hybride import HybridRetriever
+from pertinence.embedding_index import get_embedding_index
+from pertinence.query_cache import get_query_cache, query_key
+from drug_gene_interactions.interaction_store import get_store
+from drug_gene_interactions.gene_categories import get_categories
+from pertinence.pubmed_cache import get_cache
+from pertinence.pubmed_client import get_client
+from treatment_recommender import ESMOTreatmentRecommender
+from affichage_web.text_response import build_affichage
+from indexation.preprocessing import warm_up as warm_up_preprocessing
+
+GUIDELINES_PATH = os.path.join(ROOT_DIR, "guidelines_metastatic.json")
+
+
+class SearchEngine:
+
+    def __init__(self, index_path=INDEX_PATH, guidelines_path=GUIDELINES_PATH, model="vectoriel", k1=1.5, b=0.75):
+        self.model = model
+        self.index = load_index(index_path)
+        self.tfidf = TfidfMatrix(self.index)
+        self.bm25 = BM25(self.index, k1=k1, b=b)
+        self.recommender = ESMOTreatmentRecommender(guidelines_path)
+        self.interaction_store = get_store()
+        self.gene_categories = get_categories()
+        self.pubmed_cache = get_cache()
+        self.pubmed_client = get_client()
+        self.query_cache = get_query_cache()
+        self._hybrid = None
+        self._hybrid_lock = threading.Lock()
+
+    @property
+    def hybrid(self):
+        """Recherche hybride BM25 + embeddings, construite au premier usage (index d'embeddings et modèle chargés à ce moment)."""
+        if self._hybrid is None:
+            with self._hybrid_lock:
+                if self._hybrid is None:
+                    self._hybrid = HybridRetriever(self.bm25, get_embedding_index())
+        return self._hybrid
+
+    def recommend(self, patient):
+        """Recommandations ESMO pour un patient (dictionnaire ou chemin de fichier JSON)."""
+        return self.recommender.process_patient(patient)
+
+    def affichage(self, patient, model=None):
+        """Pipeline complet en mémoire : recommandations, documents et interactions prêts à afficher."""
+        return build_affichage(self.recommend(patient), self, model or self.model)
+
+    def rank(self, query_tokens, model=None, top_k=None, phrases=()):
+        """
+        Classement des documents pour une requête déjà tokenisée ("vectoriel" ou "bm25"), éventuellement limité à top_k
+        (le modèle "hybride" a aussi besoin du texte de la requête, cf. HybridRetriever.rank).
+        phrases : listes de tokens à retrouver telles quelles ou rapprochées (bonus, si l'index a les positions)
+        """
+        if (model or self.model) == "bm25":
+            key = query_key("bm25", query_tokens, phrases, top_k, k1=self.bm25.k1, b=self.bm25.b)
+            compute = lambda: rank_documents_bm25(query_tokens, self.bm25, top_k, phrase_boosts(self.index, phrases))
+        else:
+            key = query_key("vectoriel", query_tokens, phrases, top_k)
+            compute = lambda: rank_documents_vectoriel(query_tokens, self.tfidf, top_k, phrase_boosts(self.index, phrases))
+        return self.query_cache.get_or_compute(key, self.index.version, compute)
+
+    def cache_stats(self):
+        """Compteurs du cache de requêtes : hits, misses, entrées, taux de succès, version de l'index."""
+        return self.query_cache.stats()
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def load_engine(**kwargs):
+    """(Re)charge le moteur partagé, par exemple après une ré-indexation."""
+    global _engine
+    engine = SearchEngine(**kwargs)
+    with _engine_lock:
+        _engine = engine
+    return engine
+
+
+def get_engine():
+    """Retourne le moteur partagé, en le chargeant au premier appel si besoin."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = SearchEngine()
+    return _engine
+
+
+def warm_up():
+    """
+    Charge le moteur partagé et les ressources NLTK dans un thread en arrière-plan et retourne ce thread.
+    Une requête qui arrive pendant le chargement attend le moteur (get_engine) au lieu de le recharger.
+    """
+    def load():
+        try:
+            get_engine()
+            warm_up_preprocessing()
+        except (FileNotFoundError, LookupError) as e:
+            # Index, tables ou données NLTK absents (ex : manage.py migrate avant indexation) : chargement au premier appel
+            print(f"Moteur de recherche non préchargé : {e}")
+
+    thread = threading.Thread(target=load, name="search-engine-warm-up", daemon=True)
+    thread.start()
+    return thread
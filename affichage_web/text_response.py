@@ -1,8 +1,67 @@
 import json
-from drug_gene_interactions.genes_treatment import *
-from pertinence.pertinence_vectorielle import *
-from pertinence.pertinence_word2vec import *
-from pertinence.retour_doc import *
+import time
+import threading
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, wait
+from drug_gene_interactions.genes_treatment import gene_interaction
+from pertinence.pertinence_vectorielle import doc_pertinents_vectoriel
+from pertinence.pertinence_proba import doc_pertinents_bm25
+from pertinence.pertinence_hybride import doc_pertinents_hybride
+from pertinence.retour_doc import doc_description, extract_title_from_filename
+from pertinence.pubmed_cache import NO_ABSTRACT, NO_AUTHOR, NO_DATE
+
+# Nombre de documents affichés par traitement (cf. doc_description)
+NB_DOCS = 5
+
+# build_affichage : étapes lancées en parallèle sur toutes les recommandations, chacune avec son délai (secondes).
+# Une tâche qui dépasse le délai de son étape est remplacée par des valeurs par défaut (son résultat est abandonné) ;
+# les appels réseau reçoivent l'échéance de leur étape et s'arrêtent d'eux-mêmes (cf. EfetchClient.fetch).
+STAGE_TIMEOUTS = {"documents": 30, "descriptions": 20, "genes": 10}
+# Pool de chaque étape : les appels réseau (PubMed) ont le leur, un NCBI lent ne bloque pas les classements
+STAGE_POOLS = {"documents": "calcul", "genes": "calcul", "descriptions": "reseau"}
+POOL_WORKERS = {"calcul": 8, "reseau": 8}
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(pool="calcul"):
+    """Pools de threads partagés de l'affichage (distincts de celui de pertinence_hybride : pas d'attente croisée)."""
+    if pool not in _executors:
+        with _executors_lock:
+            if pool not in _executors:
+                _executors[pool] = ThreadPoolExecutor(max_workers=POOL_WORKERS[pool], thread_name_prefix=f"affichage-{pool}")
+    return _executors[pool]
+
+
+def stage_deadline(name):
+    """Échéance (time.monotonic()) d'une étape qui commence maintenant."""
+    return time.monotonic() + STAGE_TIMEOUTS[name]
+
+
+def start_stage(name, tasks, deadline=None):
+    """Lance les tâches [(fonction, args), ...] de l'étape dans son pool ; échéance par défaut : stage_deadline(name)."""
+    executor = get_executor(STAGE_POOLS[name])
+    return name, deadline or stage_deadline(name), [executor.submit(fn, *args) for fn, args in tasks]
+
+
+def stage_results(stage, defaults):
+    """
+    Résultats de l'étape dans l'ordre des tâches, en attendant au plus jusqu'à son échéance ;
+    defaults[i] pour une tâche en retard. Une exception d'une tâche est relancée.
+    """
+    name, deadline, futures = stage
+    wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+    results = []
+    for future, default in zip(futures, defaults):
+        if future.done():
+            results.append(future.result())
+        else:
+            # N'annule qu'une tâche encore en file d'attente ; une tâche en cours se termine en arrière-plan
+            future.cancel()
+            print(f"Étape {name} : délai de {STAGE_TIMEOUTS[name]} s dépassé, valeurs par défaut")
+            results.append(default)
+    return results
 
 
 def interaction(dico):
@@ -22,7 +81,7 @@ def interaction(dico):
 def message(dico_traitements, dico, genes_desc, docs_abstract, docs_date, docs_name):
     print("Tested biomarkers : ")
     genes_vu = {}
-    for gene, (type, desc) in genes_desc.items():
+    for gene, (type, desc, categories) in genes_desc.items():
         print(f"{gene} ({type}) : {desc}")
     print()
     for traitement, (evidence_level, recommendation_strength, rationale) in dico_traitements.items():
@@ -40,18 +99,52 @@ def message(dico_traitements, dico, genes_desc, docs_abstract, docs_date, docs_n
         print(f"{docs_abstract[i]}")
 
 
-#output file est le fichier json recommendation_MBC_001
-def json_message(output_file, patient_id):
+def documents_pertinents(data, engine=None, model="vectoriel"):
+    # Seuls les NB_DOCS premiers documents sont décrits : classement top-k, sans trier tout le corpus
+    if model == "bm25":
+        return doc_pertinents_bm25(data, bm25=engine.bm25 if engine else None, top_k=NB_DOCS)
+    if model == "vectoriel":
+        return doc_pertinents_vectoriel(data, tfidf=engine.tfidf if engine else None, top_k=NB_DOCS)
+    if model == "hybride":
+        return doc_pertinents_hybride(data, retriever=engine.hybrid if engine else None, top_k=NB_DOCS)
+    raise ValueError(f"Modèle de pertinence inconnu : {model}")
+
+
+#data est le dictionnaire produit par ESMOTreatmentRecommender.process_patient (contenu de recommendation_MBC_001.json)
+#engine : moteur de recherche persistant (affichage_web.search_engine), évite de recharger index et tables
+#model : "vectoriel" (similarité cosinus tf-idf), "bm25" ou "hybride" (BM25 + embeddings, fusion des rangs)
+#Retourne le dictionnaire d'affichage {'traitement i': {...}} sans passer par le disque
+#Les recommandations sont indépendantes : classement (une tâche par recommandation), interactions médicament-gène
+#et descriptions des documents (cache PubMed / efetch) tournent en parallèle, chaque étape bornée par STAGE_TIMEOUTS
+def build_affichage(data, engine=None, model="vectoriel"):
     
-    with open(output_file, "r") as f:
-        data = json.load(f)
     reco = data["recommendations"]
-    #utilisation du modèle vectoriel
-    docs = doc_pertinents_vectoriel(output_file)
+    if model not in ("bm25", "vectoriel", "hybride"):
+        raise ValueError(f"Modèle de pertinence inconnu : {model}")
+    # Sans moteur, le modèle est chargé à chaque appel : une seule tâche pour toutes les recommandations
+    batches = [dict(data, recommendations=[r]) for r in reco] if engine and reco else [data]
+    documents = start_stage("documents", [(documents_pertinents, (batch, engine, model)) for batch in batches])
+    genes = start_stage("genes", [(partial(gene_interaction, store=engine.interaction_store if engine else None,
+                                           categories=engine.gene_categories if engine else None), (data,))])
+    docs = [elem for batch in stage_results(documents, [[]] * len(batches)) for elem in batch]
     #utilisation du modèle word2wec
     #docs = run_word2vec_recommendations(output_file)
+
+    # Descriptions des documents de chaque recommandation (un seul appel groupé par recommandation),
+    # lancées pendant que les interactions se terminent
+    deadline = stage_deadline("descriptions")
+    describe = partial(doc_description,
+                       cache=engine.pubmed_cache if engine else None,
+                       client=engine.pubmed_client if engine else None,
+                       doc_table=engine.index.doc_by_name if engine else None,
+                       deadline=deadline)
+    descriptions = start_stage("descriptions", [(describe, (elem['results'],)) for elem in docs], deadline)
+    (dico, genes_desc), = stage_results(genes, [([{}] * len(reco), {})])
+    descriptions = stage_results(descriptions, [
+        ([NO_ABSTRACT] * n, [NO_DATE] * n, [NO_AUTHOR] * n, [score for _, score in elem['results']])
+        for elem in docs for n in [min(NB_DOCS, len(elem['results']))]])
+
     recommendations = {}
-    dico, genes_desc = gene_interaction(output_file)
     print(len(reco))
     for i in range(len(reco)):
         dico_traitements = {}
@@ -61,11 +154,12 @@ def json_message(output_file, patient_id):
         dico_traitements['rationale'] = reco[i]['rationale']
         dico_traitements['description_genes'] = []
         
-        for gene, (type, desc) in genes_desc.items():
+        for gene, (type, desc, categories) in genes_desc.items():
             dico_aux = {}
             dico_aux['gene'] = gene
             dico_aux['type'] = type
             dico_aux['desc'] = desc
+            dico_aux['categories'] = categories
             dico_traitements['description_genes'].append(dico_aux)
             
         dico_traitements['interaction'] = []
@@ -79,9 +173,9 @@ def json_message(output_file, patient_id):
                 dico_aux[medic]['date'] = date
         dico_traitements['interaction'].append(dico_aux)
         dico_traitements['docs'] = []
-        for elem in docs:
+        for elem, description in zip(docs, descriptions):
             if elem['treatment'] == reco[i]['treatment']:
-                docs_abstract, docs_date, docs_author, docs_score = doc_description(elem['results'])
+                docs_abstract, docs_date, docs_author, docs_score = description
                 # Itérer sur chaque doc pour associer titre, date et abstract ensemble
                 for j in range(len(docs_author)):
                     dico_aux_doc = {}
@@ -96,37 +190,16 @@ def json_message(output_file, patient_id):
 
         recommendations[f'traitement {i}'] = dico_traitements
 
-    with open(f"affichage_{patient_id[4:]}.json", "w", encoding="utf-8") as f:
-        json.dump(recommendations, f, indent=4, ensure_ascii=False)
-
+    return recommendations
 
 
-
-    
-    
-    
+#output file est le fichier json recommendation_MBC_001 ; export optionnel de l'affichage dans affichage_<id>.json
+def json_message(output_file, patient_id, engine=None, model="vectoriel"):
     
-
-def main():
-    file = "recommendations_MBC_005.json"
-    with open(file, "r") as f:
+    with open(output_file, "r") as f:
         data = json.load(f)
-    f.close()
-    reco = data["recommendations"]
-    dico_traitements = {}
-    for i in range(len(reco)):
-        dico_traitements['treatment_title'] = reco[i]['treatment']
-        dico_traitements['evidence_level'] = reco[i]['evidence_level']
-        dico_traitements['recommendation_strength'] = reco[i]['recommendation_strength']
-        dico_traitements['rationale'] = reco[i]['rationale']
-
-    
-
-    dico, genes_desc = gene_interaction(file)
-    docs = doc_pertinents_vectoriel(file)
-    docs_abstract, docs_date, docs_name = doc_description(docs) 
-    message(dico_traitements, dico, genes_desc, docs_abstract, docs_date, docs_name)
-
-    
-
+    recommendations = build_affichage(data, engine, model)
 
+    with open(f"affichage_{patient_id[4:]}.json", "w", encoding="utf-8") as f:
+        json.dump(recommendations, f, indent=4, ensure_ascii=False)
+    return recommendations
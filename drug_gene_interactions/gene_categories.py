@@ -0,0 +1,103 @@
+"""
+Catégories des gènes (DGIdb, categories.tsv : name, name-2, source_db_name, source_db_version),
+chargées une seule fois par processus.
+
+Les chaînes de catégories et de sources sont internées (une seule copie, identifiant entier) et
+les lignes sont rangées dans des tableaux NumPy triés par gène : les lignes d'un gène forment
+une tranche. La liste triée des gènes sert de trie aplati : une recherche exacte passe par un
+dictionnaire, une recherche par préfixe par dichotomie sur cette liste.
+"""
+
+import os
+import sys
+import csv
+import bisect
+import threading
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(BASE_DIR))
+from drug_gene_interactions.interaction_store import normalize_gene
+
+CATEGORIES_PATH = os.path.join(BASE_DIR, "categories.tsv")
+
+
+class GeneCategories:
+
+    def __init__(self, path=CATEGORIES_PATH):
+        categories = {}
+        sources = {}
+        rows = []
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            reader = csv.reader(f, delimiter="\t")
+            next(reader)  # en-tête
+            for row in reader:
+                if len(row) < 4 or not row[0].strip():
+                    continue
+                gene, category, source, version = row[:4]
+                category_id = categories.setdefault(category, len(categories))
+                source_id = sources.setdefault((source, version), len(sources))
+                rows.append((normalize_gene(gene), category_id, source_id))
+
+        # Tri par gène (stable : les lignes d'un gène restent dans l'ordre du fichier)
+        rows.sort(key=lambda row: row[0])
+        self.categories = list(categories)
+        self.sources = list(sources)
+        self.category_ids = np.fromiter((row[1] for row in rows), dtype=np.uint16, count=len(rows))
+        self.source_ids = np.fromiter((row[2] for row in rows), dtype=np.uint16, count=len(rows))
+
+        # Gènes triés sans doublon et début de leur tranche de lignes
+        self.genes = []
+        offsets = []
+        for i, (gene, _, _) in enumerate(rows):
+            if not self.genes or self.genes[-1] != gene:
+                self.genes.append(gene)
+                offsets.append(i)
+        offsets.append(len(rows))
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.gene_ids = {gene: i for i, gene in enumerate(self.genes)}
+
+    def __contains__(self, gene):
+        return normalize_gene(gene) in self.gene_ids
+
+    def __len__(self):
+        return len(self.genes)
+
+    def _slice(self, gene):
+        i = self.gene_ids.get(normalize_gene(gene))
+        if i is None:
+            return slice(0, 0)
+        return slice(self.offsets[i], self.offsets[i + 1])
+
+    def entries(self, gene):
+        """[(category, source_db_name, source_db_version), ...] pour un gène, dans l'ordre du fichier."""
+        rows = self._slice(gene)
+        return [(self.categories[c], *self.sources[s])
+                for c, s in zip(self.category_ids[rows].tolist(), self.source_ids[rows].tolist())]
+
+    def categories_of(self, gene):
+        """Catégories d'un gène, sans doublon (plusieurs sources peuvent donner la même)."""
+        rows = self._slice(gene)
+        return [self.categories[c] for c in dict.fromkeys(self.category_ids[rows].tolist())]
+
+    def genes_with_prefix(self, prefix):
+        """Gènes (normalisés) commençant par prefix, par ordre alphabétique."""
+        prefix = normalize_gene(prefix)
+        start = bisect.bisect_left(self.genes, prefix)
+        end = bisect.bisect_left(self.genes, prefix + chr(0x10FFFF), lo=start)
+        return self.genes[start:end]
+
+
+_categories = None
+_categories_lock = threading.Lock()
+
+
+def get_categories():
+    """Table partagée du processus."""
+    global _categories
+    if _categories is None:
+        with _categories_lock:
+            if _categories is None:
+                _categories = GeneCategories()
+    return _categories
@@ -3,23 +3,18 @@
 # les gènes qui sont en interaction avec ce traitement
 
 import json
-import pandas as pd
 import os
+import sys
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(BASE_DIR))
+from drug_gene_interactions.interaction_store import get_store
+from drug_gene_interactions.gene_categories import get_categories
 
-#Ne pas se limiter sur l'affichage des colonnes pandas
-pd.set_option('display.max_columns', None)
-pd.set_option('display.max_colwidth', None)  
 
-
-def traitements_proposes(reco_data,path):
+def traitements_proposes(reco_data):
 # Renvoie une liste de liste avec les médicaments pour chaque traitement
-    with open(path, "r") as f:
-        data = json.load(f)
-    reco = data["recommendations"]
-    traitements = [reco[i]['treatment'] for i in range(len(reco))]
-    return [traitements[i].split(' + ') for i in range(len(traitements))]
+    return [reco['treatment'].split(' + ') for reco in reco_data["recommendations"]]
 
 
 
@@ -29,58 +24,14 @@ def biomarkers_genes(reco_data):
     return(biomarkers)
 
 
-#######
-#######    Affichage de {gene:(mutation,desc)}
-#######
-
-
-def genes_biomarkers_concernes(traitement,df,reco_data):
-    
-
-# Retourne la liste des gènes concernés par le traitement ET présents dans les biomarqueurs du patient.
-    
-    biomarkers=biomarkers_genes(reco_data)
-    biomarkers_names=list(biomarkers.keys())
-
-# Filtrer pour ne garder que les gènes agissant sur la maladie présents dans les biomarqueurs du patient
-    
-    filtered_df = df[(df["drug_name"].str.lower() == traitement.lower()) ]
-
-    genes = filtered_df["gene_name"].dropna().unique().tolist()
-# Filtrer pour ne garder que les gènes présents dans les biomarqueurs du patient
-    genes_biomarkers = [g for g in genes if g in biomarkers_names]
-
-    return genes_biomarkers
-
-
-
-def genes_biomarkers_concernes_global(traitement_reco,df,reco_data,path):
-    genes=[]
-    traitement_reco=traitements_proposes(reco_data,path)
-    for reco in traitement_reco:
-        for med in reco:
-            genes=genes+genes_biomarkers_concernes(med,df,reco_data)
-        
-    return(list(set(genes)))
-
-
-def gene_info(df_info,df,reco_data,path):
+def interactions_medicaments(traitements, store, reco_data):
     """
-    Retourne un dictionnaire {gene: (mutation,desc)} pour chaque gène de la liste.
-    Si plusieurs interaction_type existent pour un même gène, seul le premier trouvé est pris.
+    Résout en une seule recherche tous les médicaments des traitements proposés (sans doublon)
+    contre la table des interactions, en ne gardant que les gènes présents dans les biomarqueurs du patient.
+    Retourne {medicament: {gene: [(gene, interaction_type, source_db_name, source_db_version), ...]}}.
     """
-    genes_biomarkers=genes_biomarkers_concernes_global(traitements_proposes,df,reco_data,path)
-
-    doublets = {}
-    for gene in genes_biomarkers:
-        # Récupérer la description
-        desc_row = df_info[df_info["Symbol"] == gene]
-        description = desc_row["description"].values[0] if not desc_row.empty else "NULL"
-        doublets[gene] = (biomarkers_genes(reco_data)[gene], description)
-        
-    return doublets
-
-
+    medicaments = dict.fromkeys(med for traitement in traitements for med in traitement)
+    return store.lookup(medicaments, genes=biomarkers_genes(reco_data))
 
 
 #######
@@ -88,62 +39,66 @@ def gene_info(df_info,df,reco_data,path):
 #######
 
 
-
-def biomarkers_traitement(traitements_reco,df,reco_data):
+def biomarkers_traitement(traitements, interactions):
     """
     Retourne une liste de dictionnaires {medicament: [(gene, interaction_type, interaction_source_db_name, interaction_source_db_version), ...]} pour chaque traitement.
+    Seuls les médicaments agissant sur au moins un biomarqueur du patient apparaissent.
     """
     reco = []
-    for recommendation in traitements_reco:
-        dico_reco={}
-        for medicament in recommendation:
-            genes = genes_biomarkers_concernes(medicament,df,reco_data)
-            gene_interactions = []
-            for gene in genes:
-                # Harmoniser la casse pour la comparaison
-                mask = (
-                    (df["drug_name"].str.lower().str.strip() == medicament.lower().strip()) &
-                    (df["gene_name"].str.upper().str.strip() == gene.upper().strip())
-                )
-                
-                
-                sub_df = df[mask]
-
-                if not sub_df.empty:
-                    for _, row in sub_df.iterrows():
-                        interaction_type = row["interaction_type"] if pd.notnull(row["interaction_type"]) else "NULL"
-                        source = row["interaction_source_db_name"] if pd.notnull(row["interaction_source_db_name"]) else "NULL"
-                        date = row["interaction_source_db_version"] if pd.notnull(row["interaction_source_db_version"]) else "NULL"
-                        gene_interactions.append((gene, interaction_type, source, date))
-
-                else:
-                    gene_interactions.append((gene, "NA", "NA", "NA"))
-                dico_reco[medicament] = gene_interactions
+    for traitement in traitements:
+        dico_reco = {}
+        for medicament in traitement:
+            genes = interactions[medicament]
+            if genes:
+                dico_reco[medicament] = [interaction for gene_interactions in genes.values() for interaction in gene_interactions]
         reco.append(dico_reco)
     return reco
 
+
 #######
-#######    Affichage final
+#######    Affichage de {gene:(mutation,desc,categories)}
 #######
 
 
-def gene_interaction(path_file):
+def gene_info(interactions, store, reco_data, categories):
     """
-    Outputs:
-    {med:(gene,interaction,db_name,db_date)}
-
-    {gene:(mutation,desc)}
+    Retourne un dictionnaire {gene: (mutation,desc,categories)} pour chaque gène biomarqueur concerné par un des traitements.
+    categories : catégories DGIdb du gène (KINASE, CLINICALLY ACTIONABLE, ...), cf. gene_categories.py
     """
-    # Ouvrir le fichier des reco
-    with open(path_file, "r") as f:
-        reco_data = json.load(f)
+    biomarkers = biomarkers_genes(reco_data)
+    doublets = {}
+    for genes in interactions.values():
+        for gene in genes:
+            if gene not in doublets:
+                doublets[gene] = (biomarkers[gene], store.description(gene), categories.categories_of(gene))
+    return doublets
 
-    # Fichiers d'interaction
-    file_path_interactions = BASE_DIR + '/interactions.tsv'
-    file_path_gene_info = BASE_DIR + '/gene_info.csv'
 
-    df = pd.read_csv(file_path_interactions, sep='\t')
-    df_info = pd.read_csv(file_path_gene_info)
+#######
+#######    Affichage final
+#######
+
+
+def gene_interaction(reco_data, store=None, categories=None):
+    """
+    Outputs:
+    [{med:[(gene,interaction,db_name,db_date), ...]}, ...] (un dictionnaire par traitement)
 
-    return (biomarkers_traitement(traitements_proposes(reco_data, path_file), df, reco_data),
-            gene_info(df_info, df, reco_data, path_file))
\ No newline at end of file
+    {gene:(mutation,desc,categories)}
+
+    reco_data : dictionnaire de recommandations déjà en mémoire, ou chemin du fichier (lu une seule fois)
+    store : table des interactions (cf. interaction_store.py), par défaut celle partagée du processus
+    categories : table des catégories de gènes (cf. gene_categories.py), idem
+    """
+    if not isinstance(reco_data, dict):
+        with open(reco_data, "r") as f:
+            reco_data = json.load(f)
+
+    # Table des interactions, chargée une seule fois par processus
+    store = store if store is not None else get_store()
+    categories = categories if categories is not None else get_categories()
+
+    # Une seule passe : les deux vues sont construites à partir de la même recherche
+    traitements = traitements_proposes(reco_data)
+    interactions = interactions_medicaments(traitements, store, reco_data)
+    return biomarkers_traitement(traitements, interactions), gene_info(interactions, store, reco_data, categories)
@@ -0,0 +1,185 @@
+"""
+Table des interactions médicament-gène (DGIdb) chargée une seule fois par processus.
+
+interactions.tsv et gene_info.csv sont convertis une fois en archive NumPy colonne par colonne
+(interaction_store.npz) avec les clés normalisées (médicament en minuscules, gène en majuscules,
+sans espaces autour) et le regroupement des lignes : les démarrages suivants ne relisent plus le texte.
+Les index par médicament et par (médicament, gène) sont des dictionnaires : une recherche coûte
+le nombre de lignes trouvées, pas la taille de la table.
+"""
+
+import os
+import threading
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+INTERACTIONS_PATH = os.path.join(BASE_DIR, "interactions.tsv")
+GENE_INFO_PATH = os.path.join(BASE_DIR, "gene_info.csv")
+STORE_PATH = os.path.join(BASE_DIR, "interaction_store.npz")
+
+INTERACTION_COLUMNS = ["drug_name", "gene_name", "interaction_type",
+                       "interaction_source_db_name", "interaction_source_db_version"]
+GENE_INFO_COLUMNS = ["Symbol", "description"]
+
+
+def normalize_drug(name):
+    return name.strip().lower()
+
+
+def normalize_gene(name):
+    return name.strip().upper()
+
+
+def _column(df, name):
+    # Colonne texte de longueur fixe ; les valeurs manquantes deviennent ""
+    return np.asarray(df[name].fillna("").astype(str).to_numpy(), dtype=str)
+
+
+def _sources_signature(paths):
+    signature = []
+    for path in paths:
+        stat = os.stat(path)
+        signature += [stat.st_size, stat.st_mtime_ns]
+    return np.asarray(signature, dtype=np.int64)
+
+
+def pair_key(drug_key, gene_key):
+    return drug_key + "\t" + gene_key
+
+
+def build_columns(df, df_info):
+    """
+    Colonnes de l'archive : colonnes d'origine et regroupement des lignes par clés normalisées.
+    order trie les lignes valides par (médicament, gène) ; drug_starts / pair_starts marquent le début
+    de chaque groupe dans order et drug_keys / pair_keys donnent leur clé, ce qui évite tout parcours
+    ligne à ligne au chargement.
+    """
+    columns = {name: _column(df, name) for name in INTERACTION_COLUMNS}
+    columns.update({name: _column(df_info, name) for name in GENE_INFO_COLUMNS})
+
+    drug_key = np.char.lower(np.char.strip(columns["drug_name"]))
+    gene_key = np.char.upper(np.char.strip(columns["gene_name"]))
+    valid = np.flatnonzero((drug_key != "") & (gene_key != ""))
+    order = valid[np.lexsort((gene_key[valid], drug_key[valid]))]
+    drug_sorted, gene_sorted = drug_key[order], gene_key[order]
+
+    new_drug = np.ones(len(order), dtype=bool)
+    new_drug[1:] = drug_sorted[1:] != drug_sorted[:-1]
+    new_pair = new_drug.copy()
+    new_pair[1:] |= gene_sorted[1:] != gene_sorted[:-1]
+    drug_starts, pair_starts = np.flatnonzero(new_drug), np.flatnonzero(new_pair)
+
+    columns.update(order=order,
+                   drug_keys=drug_sorted[drug_starts], drug_starts=drug_starts,
+                   pair_keys=pair_key(drug_sorted[pair_starts], gene_sorted[pair_starts]), pair_starts=pair_starts)
+    return columns
+
+
+def convert_tables(interactions_path=INTERACTIONS_PATH, gene_info_path=GENE_INFO_PATH, store_path=STORE_PATH):
+    """Lit les deux fichiers texte (seul passage par pandas) et écrit l'archive colonne par colonne."""
+    import pandas as pd
+    df = pd.read_csv(interactions_path, sep='\t', usecols=INTERACTION_COLUMNS)
+    df_info = pd.read_csv(gene_info_path, usecols=GENE_INFO_COLUMNS)
+    columns = build_columns(df, df_info)
+    np.savez(store_path, signature=_sources_signature([interactions_path, gene_info_path]), **columns)
+    return columns
+
+
+class InteractionStore:
+
+    def __init__(self, columns):
+        self.genes = columns["gene_name"]
+        self.types = columns["interaction_type"]
+        self.sources = columns["interaction_source_db_name"]
+        self.versions = columns["interaction_source_db_version"]
+        self.order = columns["order"]
+
+        # Index par médicament et par (médicament, gène) : clé normalisée -> numéro de groupe dans order
+        self.drug_bounds = np.append(columns["drug_starts"], len(self.order))
+        self.pair_bounds = np.append(columns["pair_starts"], len(self.order))
+        self.by_drug = dict(zip(columns["drug_keys"].tolist(), range(len(self.drug_bounds) - 1)))
+        self.by_drug_gene = dict(zip(columns["pair_keys"].tolist(), range(len(self.pair_bounds) - 1)))
+
+        # Première description trouvée pour chaque symbole
+        symbols, first = np.unique(columns["Symbol"], return_index=True)
+        self.descriptions = dict(zip(symbols.tolist(), columns["description"][first].tolist()))
+
+    @classmethod
+    def from_frames(cls, df, df_info):
+        """Construit la table depuis des DataFrames déjà chargés (mêmes colonnes que les fichiers)."""
+        return cls(build_columns(df, df_info))
+
+    def _rows(self, bounds, group):
+        # Lignes du groupe dans l'ordre du fichier
+        if group is None:
+            return []
+        return np.sort(self.order[bounds[group]:bounds[group + 1]])
+
+    def genes_for_drug(self, drug):
+        """Gènes en interaction avec le médicament, sans doublon, dans l'ordre du fichier."""
+        rows = self._rows(self.drug_bounds, self.by_drug.get(normalize_drug(drug)))
+        return list(dict.fromkeys(self.genes[rows].tolist()))
+
+    def interactions(self, drug, gene):
+        """[(gene, interaction_type, source_db_name, source_db_version), ...] ; "NULL" si la valeur manque."""
+        key = pair_key(normalize_drug(drug), normalize_gene(gene))
+        rows = self._rows(self.pair_bounds, self.by_drug_gene.get(key))
+        return [(gene, t or "NULL", s or "NULL", v or "NULL")
+                for t, s, v in zip(self.types[rows].tolist(), self.sources[rows].tolist(), self.versions[rows].tolist())]
+
+    def lookup(self, drugs, genes=None):
+        """
+        Recherche groupée pour plusieurs médicaments : {drug: {gene: [(gene, interaction_type, source_db_name,
+        source_db_version), ...]}}, colonnes lues une seule fois pour toutes les lignes concernées.
+        genes restreint les gènes retenus (par exemple aux biomarqueurs du patient).
+        """
+        drugs = list(dict.fromkeys(drugs))
+        row_groups = [self._rows(self.drug_bounds, self.by_drug.get(normalize_drug(drug))) for drug in drugs]
+        rows = np.concatenate([np.asarray(r, dtype=np.int64) for r in row_groups]) if drugs else np.zeros(0, np.int64)
+        values = zip(self.genes[rows].tolist(), self.types[rows].tolist(),
+                     self.sources[rows].tolist(), self.versions[rows].tolist())
+
+        result = {}
+        for drug, drug_rows in zip(drugs, row_groups):
+            # Lignes du médicament regroupées par gène normalisé, gènes dans l'ordre du fichier
+            by_gene = {}
+            found = []
+            for gene, t, s, v in (next(values) for _ in range(len(drug_rows))):
+                by_gene.setdefault(normalize_gene(gene), []).append((t or "NULL", s or "NULL", v or "NULL"))
+                found.append(gene)
+            result[drug] = {gene: [(gene, *fields) for fields in by_gene[normalize_gene(gene)]]
+                            for gene in dict.fromkeys(found) if genes is None or gene in genes}
+        return result
+
+    def description(self, gene):
+        return self.descriptions.get(gene) or "NULL"
+
+
+def load_store(interactions_path=INTERACTIONS_PATH, gene_info_path=GENE_INFO_PATH, store_path=STORE_PATH):
+    """
+    Ouvre l'archive si elle est à jour par rapport aux fichiers texte, sinon la (re)construit.
+    Si les fichiers texte sont absents, l'archive seule suffit.
+    """
+    sources = [interactions_path, gene_info_path]
+    if os.path.exists(store_path):
+        with np.load(store_path) as archive:
+            up_to_date = (not all(os.path.exists(p) for p in sources)
+                          or np.array_equal(archive["signature"], _sources_signature(sources)))
+            if up_to_date:
+                return InteractionStore({name: archive[name] for name in archive.files})
+    return InteractionStore(convert_tables(interactions_path, gene_info_path, store_path))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Table partagée du processus."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = load_store()
+    return _store
@@ -0,0 +1,285 @@
+"""
+Format binaire compact de l'index inversé (remplace indexation/index.json).
+
+Un index est un dossier contenant :
+    terms.json     liste des termes (l'identifiant d'un terme est sa position)
+    docs.json      table des documents [{"name", "title", "first_author", "date", "year", "abstract"}, ...]
+                   (identifiant = position ; métadonnées extraites à l'indexation, cf. doc_metadata.py)
+    idf.npy        float64[n_terms]      un seul idf par terme
+    offsets.npy    int64[n_terms + 1]    début des postings de chaque terme
+    doc_gaps.npy   uint32[n_postings]    identifiants de documents encodés en delta
+    tfs.npy        uint32[n_postings]    tf de chaque posting
+    doc_lengths.npy uint32[n_docs]       nombre réel de tokens de chaque document (après prétraitement)
+    stats.json     {"corpus_size", "avg_doc_len"} calculés sur tout le corpus à la construction
+    term_bounds.npy uint32[n_terms, 2]   par terme : tf maximal et plus petite longueur de document de ses postings
+                   (bornes supérieures des scores par terme pour l'évaluation top-k avec élagage)
+
+Optionnel (indexation --positions) :
+    positions.npy   uint8[...]           positions des termes dans chaque document, par posting : deltas encodés en varint
+    pos_offsets.npy int64[n_postings + 1] début des octets de chaque posting dans positions.npy
+
+Les tableaux sont ouverts en mémoire mappée : l'ouverture ne lit que les deux fichiers JSON.
+La version d'un index (index_version) change à chaque reconstruction : elle invalide les caches de requêtes.
+"""
+
+import os
+import json
+import hashlib
+from collections.abc import Mapping
+from functools import lru_cache
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+INDEX_PATH = os.path.join(BASE_DIR, "index")
+
+
+def save_compact_index(index, index_path=INDEX_PATH, doc_metadata=None, doc_lengths=None, positions=None):
+    """
+    Écrit un index {term: {doc_name: (tf, idf)}} au format compact.
+    Les identifiants de documents suivent l'ordre de première apparition dans l'index.
+    doc_metadata : {doc_name: {...}} ajouté à la table des documents
+    doc_lengths : {doc_name: nombre de tokens} pour tout le corpus (longueurs utilisées par BM25)
+    positions : {doc_name: tokens prétraités} ; si fourni, la position de chaque occurrence est enregistrée
+    (recherche de phrases et de proximité)
+    """
+    doc_metadata = doc_metadata or {}
+    os.makedirs(index_path, exist_ok=True)
+
+    doc_ids = {}
+    for postings in index.values():
+        for doc in postings:
+            if doc not in doc_ids:
+                doc_ids[doc] = len(doc_ids)
+
+    terms = list(index.keys())
+    idf = np.zeros(len(terms), dtype=np.float64)
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    doc_gaps = []
+    tfs = []
+    for i, term in enumerate(terms):
+        postings = sorted((doc_ids[doc], tf, term_idf) for doc, (tf, term_idf) in index[term].items())
+        previous = 0
+        for doc_id, tf, term_idf in postings:
+            doc_gaps.append(doc_id - previous)
+            tfs.append(tf)
+            previous = doc_id
+            idf[i] = term_idf
+        offsets[i + 1] = offsets[i] + len(postings)
+
+    np.save(os.path.join(index_path, "idf.npy"), idf)
+    np.save(os.path.join(index_path, "offsets.npy"), offsets)
+    np.save(os.path.join(index_path, "doc_gaps.npy"), np.asarray(doc_gaps, dtype=np.uint32))
+    np.save(os.path.join(index_path, "tfs.npy"), np.asarray(tfs, dtype=np.uint32))
+    with open(os.path.join(index_path, "terms.json"), "w", encoding="utf-8") as f:
+        json.dump(terms, f, ensure_ascii=False)
+    with open(os.path.join(index_path, "docs.json"), "w", encoding="utf-8") as f:
+        json.dump([{"name": doc, **doc_metadata.get(doc, {})} for doc in doc_ids], f, ensure_ascii=False, indent=2)
+
+    if doc_lengths:
+        lengths = np.asarray([doc_lengths.get(doc, 0) for doc in doc_ids], dtype=np.uint32)
+        np.save(os.path.join(index_path, "doc_lengths.npy"), lengths)
+        stats = {"corpus_size": len(doc_lengths), "avg_doc_len": sum(doc_lengths.values()) / len(doc_lengths)}
+        with open(os.path.join(index_path, "stats.json"), "w", encoding="utf-8") as f:
+            json.dump(stats, f)
+        np.save(os.path.join(index_path, "term_bounds.npy"),
+                _term_bounds(offsets, np.asarray(doc_gaps, dtype=np.uint32), np.asarray(tfs, dtype=np.uint32), lengths))
+
+    if positions:
+        _save_positions(index_path, terms, offsets, doc_gaps, list(doc_ids), positions)
+
+
+def _save_positions(index_path, terms, offsets, doc_gaps, doc_names, tokenized_corpus):
+    # Positions de chaque terme indexé dans chaque document, dans l'ordre des postings
+    term_set = set(terms)
+    occurrences = {}
+    for doc in doc_names:
+        by_term = {}
+        for position, token in enumerate(tokenized_corpus.get(doc, [])):
+            if token in term_set:
+                by_term.setdefault(token, []).append(position)
+        occurrences[doc] = by_term
+
+    deltas = []
+    counts = np.zeros(len(doc_gaps), dtype=np.int64)
+    doc_of_posting = _decode_doc_ids(offsets, np.asarray(doc_gaps, dtype=np.uint32))
+    for i, term in enumerate(terms):
+        for p in range(offsets[i], offsets[i + 1]):
+            term_positions = occurrences[doc_names[doc_of_posting[p]]].get(term, [])
+            # Première position telle quelle, puis écarts avec la précédente
+            previous = 0
+            for position in term_positions:
+                deltas.append(position - previous)
+                previous = position
+            counts[p] = len(term_positions)
+
+    data, nbytes = _varint_encode(deltas)
+    bytes_per_posting = np.bincount(np.repeat(np.arange(len(counts)), counts), weights=nbytes,
+                                    minlength=len(counts)).astype(np.int64)
+    np.save(os.path.join(index_path, "positions.npy"), data)
+    np.save(os.path.join(index_path, "pos_offsets.npy"), np.concatenate(([0], np.cumsum(bytes_per_posting))))
+
+
+def _varint_encode(values):
+    # 7 bits par octet, bit de poids fort à 1 tant que la valeur continue ; retourne (octets, octets par valeur)
+    values = np.asarray(values, dtype=np.uint64)
+    nbytes = np.ones(len(values), dtype=np.int64)
+    for shift in (7, 14, 21, 28, 35):
+        nbytes += values >= (1 << shift)
+    starts = np.concatenate(([0], np.cumsum(nbytes)[:-1])).astype(np.int64)
+    data = np.zeros(int(nbytes.sum()), dtype=np.uint8)
+    for j in range(int(nbytes.max()) if len(values) else 0):
+        selected = nbytes > j
+        byte = (values[selected] >> np.uint64(7 * j)) & np.uint64(0x7F)
+        byte |= np.where(nbytes[selected] > j + 1, np.uint64(0x80), np.uint64(0))
+        data[starts[selected] + j] = byte
+    return data, nbytes
+
+
+def _varint_decode(data):
+    data = np.asarray(data, dtype=np.uint8)
+    if not len(data):
+        return np.zeros(0, dtype=np.int64)
+    last = (data & 0x80) == 0
+    value_of_byte = np.concatenate(([0], np.cumsum(last)[:-1]))
+    ends = np.flatnonzero(last)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    shift = ((np.arange(len(data)) - starts[value_of_byte]) * 7).astype(np.uint64)
+    parts = (data & 0x7F).astype(np.uint64) << shift
+    return np.bitwise_or.reduceat(parts, starts).astype(np.int64)
+
+
+def _decode_doc_ids(offsets, doc_gaps):
+    # Identifiant de document de chaque posting : cumul des deltas, remis à zéro au début de chaque liste
+    cumulative = np.concatenate(([0], np.cumsum(doc_gaps, dtype=np.int64)))
+    base = np.repeat(cumulative[offsets[:-1]], np.diff(offsets))
+    return cumulative[1:] - base
+
+
+def _term_bounds(offsets, doc_gaps, tfs, doc_lengths):
+    # [tf maximal, plus petite longueur de document] sur les postings de chaque terme
+    starts = np.asarray(offsets[:-1])
+    if not len(starts):
+        return np.zeros((0, 2), dtype=np.uint32)
+    lengths = np.asarray(doc_lengths)[_decode_doc_ids(np.asarray(offsets), doc_gaps)]
+    return np.stack([np.maximum.reduceat(np.asarray(tfs), starts),
+                     np.minimum.reduceat(lengths, starts)], axis=1).astype(np.uint32)
+
+
+def index_version(index_path=INDEX_PATH):
+    """Empreinte courte des fichiers de l'index (nom, taille, date de modification)."""
+    signature = sorted((entry.name, entry.stat().st_size, entry.stat().st_mtime_ns)
+                       for entry in os.scandir(index_path) if entry.is_file())
+    return hashlib.sha1(repr(signature).encode("utf-8")).hexdigest()[:16]
+
+
+class CompactIndex(Mapping):
+    """
+    Lecture d'un index compact. Se comporte comme l'ancien dictionnaire
+    {term: {doc_name: (tf, idf)}} pour les classeurs existants, et expose
+    directement les tableaux de postings pour les moteurs vectorisés.
+    """
+
+    def __init__(self, index_path=INDEX_PATH, mmap=True):
+        mode = "r" if mmap else None
+        self.index_path = index_path
+        self.version = index_version(index_path)
+        with open(os.path.join(index_path, "terms.json"), "r", encoding="utf-8") as f:
+            self.terms = json.load(f)
+        with open(os.path.join(index_path, "docs.json"), "r", encoding="utf-8") as f:
+            self.docs = json.load(f)
+        self.term_ids = {term: i for i, term in enumerate(self.terms)}
+        self.doc_names = [doc["name"] for doc in self.docs]
+        self.doc_by_name = {doc["name"]: doc for doc in self.docs}
+        self.idf = np.load(os.path.join(index_path, "idf.npy"), mmap_mode=mode)
+        self.offsets = np.load(os.path.join(index_path, "offsets.npy"), mmap_mode=mode)
+        self.doc_gaps = np.load(os.path.join(index_path, "doc_gaps.npy"), mmap_mode=mode)
+        self.tfs = np.load(os.path.join(index_path, "tfs.npy"), mmap_mode=mode)
+        self._term_view = lru_cache(maxsize=4096)(self._term_view)
+
+        lengths_path = os.path.join(index_path, "doc_lengths.npy")
+        if os.path.exists(lengths_path):
+            self.doc_lengths = np.load(lengths_path, mmap_mode=mode)
+            with open(os.path.join(index_path, "stats.json"), "r", encoding="utf-8") as f:
+                stats = json.load(f)
+            self.corpus_size, self.avg_doc_len = stats["corpus_size"], stats["avg_doc_len"]
+        else:
+            # Index construit sans les longueurs : somme des tf des termes indexés
+            self.doc_lengths = np.bincount(self.doc_ids(), weights=self.tfs, minlength=self.n_docs)
+            self.corpus_size = self.n_docs
+            self.avg_doc_len = float(self.doc_lengths.mean()) if self.n_docs else 0.0
+
+        bounds_path = os.path.join(index_path, "term_bounds.npy")
+        if os.path.exists(bounds_path):
+            self.term_bounds = np.load(bounds_path, mmap_mode=mode)
+        else:
+            self.term_bounds = _term_bounds(self.offsets, self.doc_gaps, self.tfs, self.doc_lengths)
+
+        positions_path = os.path.join(index_path, "positions.npy")
+        self.has_positions = os.path.exists(positions_path)
+        if self.has_positions:
+            self.position_data = np.load(positions_path, mmap_mode=mode)
+            self.pos_offsets = np.load(os.path.join(index_path, "pos_offsets.npy"), mmap_mode=mode)
+
+    @property
+    def n_docs(self):
+        return len(self.docs)
+
+    def postings(self, term):
+        """Retourne (doc_ids, tfs) triés par identifiant de document."""
+        i = self.term_ids[term]
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return np.cumsum(self.doc_gaps[start:end], dtype=np.int64), np.asarray(self.tfs[start:end])
+
+    def positions(self, term, doc_ids):
+        """
+        Positions (triées) du terme dans chacun des documents doc_ids, qui doivent figurer dans ses postings.
+        Seuls les octets des postings demandés sont décodés.
+        """
+        if not self.has_positions:
+            raise ValueError(f"Index sans positions : {self.index_path} (reconstruire avec indexation.py --positions)")
+        i = self.term_ids[term]
+        term_docs, _ = self.postings(term)
+        postings = self.offsets[i] + np.searchsorted(term_docs, doc_ids)
+        result = []
+        for p in postings:
+            start, end = self.pos_offsets[p], self.pos_offsets[p + 1]
+            result.append(np.cumsum(_varint_decode(self.position_data[start:end])))
+        return result
+
+    def doc_ids(self):
+        """Identifiant de document de chaque posting, dans l'ordre du fichier (décodage de tous les deltas)."""
+        return _decode_doc_ids(np.asarray(self.offsets), self.doc_gaps)
+
+    def _term_view(self, term):
+        doc_ids, tfs = self.postings(term)
+        term_idf = float(self.idf[self.term_ids[term]])
+        return {self.doc_names[d]: (int(tf), term_idf) for d, tf in zip(doc_ids, tfs)}
+
+    def __getitem__(self, term):
+        if term not in self.term_ids:
+            raise KeyError(term)
+        return self._term_view(term)
+
+    def __contains__(self, term):
+        return term in self.term_ids
+
+    def __iter__(self):
+        return iter(self.terms)
+
+    def __len__(self):
+        return len(self.terms)
+
+    def to_dict(self):
+        """Vue complète {term: {doc_name: (tf, idf)}} (équivalent de l'ancien index.json)."""
+        return {term: self._term_view(term) for term in self.terms}
+
+
+def load_index(index_path=INDEX_PATH, mmap=True):
+    return CompactIndex(index_path, mmap=mmap)
+
+
+def load_doc_table(index_path=INDEX_PATH):
+    """Table des documents seule : {doc_name: {title, first_author, date, year, abstract}}."""
+    with open(os.path.join(index_path, "docs.json"), "r", encoding="utf-8") as f:
+        return {doc["name"]: doc for doc in json.load(f)}
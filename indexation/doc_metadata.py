@@ -0,0 +1,83 @@
+"""
+Métadonnées des documents extraites une seule fois à l'indexation (titre, premier auteur, date, année,
+aperçu de l'abstract) et rangées dans la table des documents de l'index (docs.json).
+Les fonctions travaillent sur le texte des pages déjà extrait par PyMuPDF.
+"""
+
+import os
+import re
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from pertinence.pubmed_cache import NO_ABSTRACT, NO_AUTHOR, NO_DATE
+
+NO_TITLE = "Titre non trouvé"
+
+
+def title_from_filename(filename):
+    if filename.endswith('.pdf'):
+        filename = filename[:-4]
+    parts = filename.split('_')
+    if len(parts) > 2: #on enleve le PMID + le num du doc
+        return ' '.join(parts[2:])
+    return NO_TITLE
+
+
+def abstract_preview_from_pages(pages, n_words=100):
+    # Cherche "abstract" (ou "a b s t r a c t") dans les 3 premières pages
+    abstract_text = ""
+    for text in pages[:3]:
+        clean_text = re.sub(r'\s+', ' ', text).lower()
+        start_idx = -1
+        if "abstract" in clean_text:
+            start_idx = clean_text.find("abstract")
+        elif "a b s t r a c t" in clean_text:
+            start_idx = clean_text.find("a b s t r a c t")
+        if start_idx != -1:
+            original_text = re.sub(r'\s+', ' ', text)
+            abstract_text = original_text[start_idx:].strip()
+            break
+
+    if not abstract_text:
+        return NO_ABSTRACT
+    words = abstract_text.split()
+    return ' '.join(words[:n_words]) + ('...' if len(words) > n_words else '')
+
+
+def first_date_from_pages(pages):
+    # Date qui suit un mot-clé typique dans les 2 premières pages
+    text_all = "".join(text + "\n" for text in pages[:2])
+    text_all_lower = text_all.lower()
+    keywords = ["received", "accepted", "published", "available online"]
+    date_regex = r'(\d{1,2}\s+\w+\s+\d{4}|\w+\s+\d{4}|\d{4})'
+    for keyword in keywords:
+        idx = text_all_lower.find(keyword)
+        if idx != -1:
+            match = re.search(date_regex, text_all[idx:idx + 100])
+            if match:
+                return match.group(0).strip()
+    return NO_DATE
+
+
+def year_from_date(date):
+    match = re.search(r"\d{4}", date or "")
+    return int(match.group()) if match else None
+
+
+def first_author_from_pdf_metadata(pdf_metadata):
+    authors = [a.strip() for a in re.split(r"[;,]| and ", (pdf_metadata or {}).get("author") or "") if a.strip()]
+    if not authors:
+        return NO_AUTHOR
+    return f"{authors[0]} et al." if len(authors) > 1 else authors[0]
+
+
+def extract_metadata(filename, pages, pdf_metadata=None):
+    """Entrée de la table des documents pour un PDF (sans le nom, ajouté par l'index)."""
+    date = first_date_from_pages(pages)
+    return {
+        "title": title_from_filename(filename),
+        "first_author": first_author_from_pdf_metadata(pdf_metadata),
+        "date": date,
+        "year": year_from_date(date) if date != NO_DATE else None,
+        "abstract": abstract_preview_from_pages(pages),
+    }
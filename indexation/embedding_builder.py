@@ -0,0 +1,135 @@
+"""
+Construction hors ligne de l'index d'embeddings par passages (cf. pertinence/embedding_index.py).
+
+Chaque PDF est découpé en passages de CHUNK_WORDS mots (recouvrement CHUNK_OVERLAP) page par page ;
+les passages sont encodés par paquets sur CPU, un modèle par processus du pool. Les vecteurs d'un PDF
+sont mis en cache par empreinte sha256 du manifeste d'ingestion (indexation/manifest.json) : seuls
+les PDF ajoutés ou modifiés depuis la dernière construction sont ré-encodés.
+
+À lancer après indexation.py (qui tient le manifeste à jour) :
+    python indexation/embedding_builder.py --workers 4
+"""
+
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(BASE_DIR))
+if __package__:
+    from indexation.indexation import load_manifest, MANIFEST_PATH
+else:
+    # Lancé comme script : "indexation" désigne alors le module indexation.py voisin
+    from indexation import load_manifest, MANIFEST_PATH
+from pertinence.embedding_index import save_chunked_index, EMBEDDINGS_PATH, MODEL_NAME
+
+EMBEDDING_CACHE_DIR = os.path.join(BASE_DIR, "embedding_cache")
+CHUNK_WORDS = 200
+CHUNK_OVERLAP = 50
+BATCH_SIZE = 64
+
+
+def chunk_pages(pages, chunk_words=CHUNK_WORDS, overlap=CHUNK_OVERLAP):
+    """[(page, offset du premier mot dans la page, texte du passage), ...] ; fenêtres glissantes par page."""
+    step = max(1, chunk_words - overlap)
+    chunks = []
+    for page_number, text in enumerate(pages):
+        words = text.split()
+        for offset in range(0, max(len(words) - overlap, 1), step):
+            passage = words[offset:offset + chunk_words]
+            if passage:
+                chunks.append((page_number, offset, " ".join(passage)))
+    return chunks
+
+
+_worker_model = None
+
+
+def _init_worker(model_name, threads):
+    # Un modèle par processus, chargé une seule fois ; threads limités pour ne pas surcharger le CPU
+    global _worker_model
+    import torch
+    from sentence_transformers import SentenceTransformer
+    torch.set_num_threads(threads)
+    _worker_model = SentenceTransformer(model_name, device="cpu")
+
+
+def embed_pdf(path, batch_size=BATCH_SIZE, chunk_words=CHUNK_WORDS, overlap=CHUNK_OVERLAP):
+    """Passages d'un PDF et leurs vecteurs : (float32[n, dim] normalisés, int32[n, 2] (page, offset))."""
+    import fitz  # PyMuPDF
+    with fitz.open(path) as doc:
+        pages = [page.get_text() for page in doc]
+    chunks = chunk_pages(pages, chunk_words, overlap)
+    if not chunks:
+        return np.zeros((0, 0), dtype=np.float32), np.zeros((0, 2), dtype=np.int32)
+    vectors = _worker_model.encode([text for _, _, text in chunks], batch_size=batch_size,
+                                   convert_to_numpy=True, normalize_embeddings=True)
+    pointers = np.asarray([(page, offset) for page, offset, _ in chunks], dtype=np.int32)
+    return np.asarray(vectors, dtype=np.float32), pointers
+
+
+def _cache_file(sha256, cache_dir, model_name):
+    # Le modèle fait partie de la clé : changer de modèle ré-encode tout
+    return os.path.join(cache_dir, f"{sha256}.{model_name.replace('/', '_')}.npz")
+
+
+def build_embeddings(folder="pubmed_articles", manifest_path=MANIFEST_PATH, cache_dir=EMBEDDING_CACHE_DIR,
+                     index_path=EMBEDDINGS_PATH, model_name=MODEL_NAME, workers=None, batch_size=BATCH_SIZE,
+                     force=False):
+    """
+    Encode les PDF du manifeste absents du cache (tous si force=True), puis écrit l'index par passages.
+    Les entrées du cache qui ne correspondent plus à un PDF du manifeste sont supprimées.
+    """
+    manifest = load_manifest(manifest_path)
+    if not manifest:
+        raise FileNotFoundError(f"Manifeste d'ingestion absent ou vide : {manifest_path} (lancer indexation.py d'abord)")
+    os.makedirs(cache_dir, exist_ok=True)
+
+    filenames = sorted(manifest)
+    to_process = [f for f in filenames
+                  if force or not os.path.exists(_cache_file(manifest[f]["sha256"], cache_dir, model_name))]
+    if to_process:
+        workers = workers or max(1, (os.cpu_count() or 1) // 2)
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        paths = [os.path.join(folder, f) for f in to_process]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(model_name, threads)) as pool:
+            results = pool.map(embed_pdf, paths, [batch_size] * len(paths))
+            for filename, (vectors, pointers) in zip(to_process, results):
+                np.savez(_cache_file(manifest[filename]["sha256"], cache_dir, model_name),
+                         vectors=vectors, pointers=pointers)
+
+    kept = {os.path.basename(_cache_file(manifest[f]["sha256"], cache_dir, model_name)) for f in filenames}
+    for cached in os.listdir(cache_dir):
+        if cached not in kept:
+            os.remove(os.path.join(cache_dir, cached))
+    print(f"Embeddings : {len(to_process)} PDF encodés, {len(filenames) - len(to_process)} inchangés")
+
+    # Assemblage : passages regroupés par document, documents sans texte exclus
+    doc_names, vectors, chunks = [], [], []
+    for filename in filenames:
+        with np.load(_cache_file(manifest[filename]["sha256"], cache_dir, model_name)) as cached:
+            if not len(cached["pointers"]):
+                continue
+            doc_id = len(doc_names)
+            doc_names.append(filename)
+            vectors.append(cached["vectors"])
+            chunks.append(np.column_stack((np.full(len(cached["pointers"]), doc_id, dtype=np.int32), cached["pointers"])))
+    if not doc_names:
+        raise ValueError("Aucun passage à indexer")
+    save_chunked_index(doc_names, np.concatenate(vectors), np.concatenate(chunks), index_path, model_name)
+    return doc_names
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Construction de l'index d'embeddings par passages")
+    parser.add_argument("--full", action="store_true", help="ré-encode tous les PDF, sans tenir compte du cache")
+    parser.add_argument("--workers", type=int, default=None, help="nombre de processus d'encodage")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="passages encodés ensemble")
+    parser.add_argument("--model", default=MODEL_NAME)
+    args = parser.parse_args()
+    names = build_embeddings(model_name=args.model, workers=args.workers, batch_size=args.batch_size, force=args.full)
+    print(f"{len(names)} documents indexés dans {EMBEDDINGS_PATH}")
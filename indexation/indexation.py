@@ -1,77 +1,138 @@
-import nltk
 import os
-import fitz  # PyMuPDF
-from nltk import pos_tag
-from nltk.tokenize import word_tokenize
 import xml.etree.ElementTree as ET
 import numpy as np
-from nltk.corpus import stopwords
-from nltk.stem import WordNetLemmatizer
-from nltk.corpus import wordnet, stopwords
 import json
+import hashlib
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(BASE_DIR))
+if __package__:
+    from indexation.compact_index import save_compact_index, load_index, INDEX_PATH
+    from indexation.doc_metadata import extract_metadata
+    from indexation.preprocessing import preprocess
+else:
+    # Lancé comme script (python indexation/indexation.py) : "indexation" désigne alors ce fichier,
+    # les modules voisins sont importés directement
+    from compact_index import save_compact_index, load_index, INDEX_PATH
+    from doc_metadata import extract_metadata
+    from preprocessing import preprocess
+
+MANIFEST_PATH = os.path.join(BASE_DIR, "manifest.json")
+CACHE_DIR = os.path.join(BASE_DIR, "cache")
+CACHE_SUFFIX = ".v2.json"  # {"tokens": [...], "metadata": {...}}
+
+# Nettoyage et lemmatisation : cf. preprocessing.py (commun avec les requêtes)
 
-# -----------------------------
-# Chargement des PDF
-# -----------------------------
-def load_pdf_corpus(folder_path):
-    corpus = {}
-    for filename in os.listdir(folder_path):
-        if filename.endswith(".pdf"):
-            path = os.path.join(folder_path, filename)
-            with fitz.open(path) as doc:
-                text = ""
-                for page in doc:
-                    text += page.get_text()
-                corpus[filename] = text
-    return corpus
-
-def tokenize_corpus(corpus):
-    return {name:word_tokenize(text) for name, text in corpus.items()}
 
 # -----------------------------
-# Application
+# Ingestion incrémentale
 # -----------------------------
 
+def file_signature(path, with_hash=True):
+    # Taille, date de modification et empreinte sha256 du fichier
+    stat = os.stat(path)
+    signature = {"path": path, "size": stat.st_size, "mtime": stat.st_mtime}
+    if with_hash:
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha.update(block)
+        signature["sha256"] = sha.hexdigest()
+    return signature
+
+
+def preprocess_pdf(path):
+    # Extraction + tokenisation + nettoyage + lemmatisation d'un seul PDF, et métadonnées
+    # du document (titre, auteur, date, abstract) tant que le texte est en mémoire
+    # (exécuté dans un processus du pool)
+    import fitz  # PyMuPDF
+    with fitz.open(path) as doc:
+        pages = [page.get_text() for page in doc]
+        pdf_metadata = doc.metadata
+    text = "".join(pages)
+    return {
+        "tokens": preprocess(text),
+        "metadata": extract_metadata(os.path.basename(path), pages, pdf_metadata),
+    }
+
+
+def load_manifest(manifest_path=MANIFEST_PATH):
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, manifest_path=MANIFEST_PATH):
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+
+def _cache_file(sha256, cache_dir):
+    return os.path.join(cache_dir, sha256 + CACHE_SUFFIX)
+
+
+def ingest_corpus(folder="pubmed_articles", manifest_path=MANIFEST_PATH, cache_dir=CACHE_DIR, workers=None, force=False):
+    """
+    Retourne ({doc_name: tokens prétraités}, {doc_name: métadonnées}) en ne retraitant que les PDF
+    ajoutés ou modifiés (tous si force=True).
+    Le manifeste garde pour chaque fichier (path, size, mtime, sha256) ; tokens et métadonnées sont
+    mis en cache par empreinte dans cache_dir. Les PDF supprimés sortent du manifeste.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    previous = load_manifest(manifest_path)
+    manifest = {} if force else previous
+    new_manifest = {}
+    to_process = []
+    reused = 0  # PDF dont les tokens et métadonnées en cache sont repris tels quels
+
+    filenames = [f for f in os.listdir(folder) if f.endswith(".pdf")]
+    for filename in filenames:
+        path = os.path.join(folder, filename)
+        old = manifest.get(filename)
+        signature = file_signature(path, with_hash=False)
+        # Taille et date inchangées : on fait confiance au manifeste sans relire le fichier
+        if old and old["size"] == signature["size"] and old["mtime"] == signature["mtime"] \
+                and os.path.exists(_cache_file(old["sha256"], cache_dir)):
+            new_manifest[filename] = old
+            reused += 1
+            continue
+        signature = file_signature(path)
+        new_manifest[filename] = signature
+        if force or not os.path.exists(_cache_file(signature["sha256"], cache_dir)):
+            to_process.append(filename)
+        else:
+            # Taille ou date changée mais contenu identique (même sha256)
+            reused += 1
 
+    if to_process:
+        paths = [os.path.join(folder, f) for f in to_process]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for filename, processed in zip(to_process, pool.map(preprocess_pdf, paths)):
+                with open(_cache_file(new_manifest[filename]["sha256"], cache_dir), "w", encoding="utf-8") as f:
+                    json.dump(processed, f, ensure_ascii=False)
 
-def read_corpus():
-    
-    folder = "pubmed_articles"
-    corpus = load_pdf_corpus(folder)
-    tokenized_corpus = tokenize_corpus(corpus)
-    
-    return tokenized_corpus
-
-
-
-def tokenize_and_clean(tokenized_text):
-    tokenized_text=[t.lower() for t in tokenized_text]
-    stop_words = set(stopwords.words('english'))
-    tokens = [
-        t for t in tokenized_text
-        if t.isalnum() and t not in stop_words
-    ]
-    return tokens
-
-
-def lemmatization(text):
-    lemmatizer = WordNetLemmatizer()
+    # Nettoyage du cache : fichiers supprimés ou modifiés, anciens formats
+    kept = {os.path.basename(_cache_file(entry["sha256"], cache_dir)) for entry in new_manifest.values()}
+    for cached in os.listdir(cache_dir):
+        if cached not in kept:
+            os.remove(os.path.join(cache_dir, cached))
 
-    # Fonction utilitaire pour convertir POS vers WordNet
-    def get_wordnet_pos(treebank_tag):
-        if treebank_tag.startswith('J'):
-            return wordnet.ADJ
-        elif treebank_tag.startswith('V'):
-            return wordnet.VERB
-        elif treebank_tag.startswith('N'):
-            return wordnet.NOUN
-        elif treebank_tag.startswith('R'):
-            return wordnet.ADV
-        else:
-            return wordnet.NOUN  # défaut
+    removed = [f for f in previous if f not in new_manifest]
+    print(f"Ingestion : {len(to_process)} PDF traités, {len(removed)} supprimés, "
+          f"{reused} repris du cache")
+    save_manifest(new_manifest, manifest_path)
 
-    tagged = pos_tag(text)
-    return [lemmatizer.lemmatize(word, get_wordnet_pos(pos)) for word, pos in tagged]
+    tokenized_corpus = {}
+    metadata = {}
+    for filename in filenames:
+        with open(_cache_file(new_manifest[filename]["sha256"], cache_dir), "r", encoding="utf-8") as f:
+            processed = json.load(f)
+        tokenized_corpus[filename] = processed["tokens"]
+        metadata[filename] = processed["metadata"]
+    return tokenized_corpus, metadata
 
 
 
@@ -79,11 +140,7 @@ def lemmatization(text):
 #Extraction du vocabulaire
 
 
-def inverted_index():
-    tokenized_corpus = read_corpus()
-    tokenized_corpus = {name : tokenize_and_clean(text) for name,text in tokenized_corpus.items()}
-    tokenized_corpus = {name : lemmatization(text) for name,text in tokenized_corpus.items()}
-    
+def build_index(tokenized_corpus):
     index={}
     N=len(tokenized_corpus)
     idf={}
@@ -112,24 +169,35 @@ def inverted_index():
 
 
 
-def save_inverted_index(index, index_path="indexation/index.json"):
-    # Sauvegarde le dictionnaire d'index inversé
-    with open(index_path, "w", encoding="utf-8") as f:
-        json.dump(index, f, ensure_ascii=False, indent=2)
+def save_inverted_index(index, index_path=INDEX_PATH, doc_metadata=None, doc_lengths=None, positions=None):
+    # Sauvegarde le dictionnaire d'index inversé au format binaire compact (cf. compact_index.py),
+    # avec les métadonnées des documents dans la table docs.json et leurs longueurs (BM25)
+    # positions : corpus tokenisé {doc: tokens}, pour enregistrer les positions (phrases, proximité)
+    save_compact_index(index, index_path, doc_metadata, doc_lengths, positions)
 
 
 
 
 if __name__ == "__main__":
-    index = inverted_index()
-    save_inverted_index(index)
+    import argparse
+    parser = argparse.ArgumentParser(description="Construction de l'index inversé")
+    parser.add_argument("--full", action="store_true", help="ré-indexation complète, sans tenir compte du manifeste")
+    parser.add_argument("--workers", type=int, default=None, help="nombre de processus d'ingestion")
+    parser.add_argument("--positions", action="store_true",
+                        help="enregistre aussi les positions des termes (recherche de phrases et de proximité)")
+    args = parser.parse_args()
+    tokenized_corpus, doc_metadata = ingest_corpus(workers=args.workers, force=args.full)
+    doc_lengths = {doc: len(tokens) for doc, tokens in tokenized_corpus.items()}
+    save_inverted_index(build_index(tokenized_corpus), doc_metadata=doc_metadata, doc_lengths=doc_lengths,
+                        positions=tokenized_corpus if args.positions else None)
 
 
 
 
 
 
-def vocab_relevance():
-    index=inverted_index()
+def vocab_relevance(index_path=INDEX_PATH):
+    # Lit l'index enregistré au lieu de le reconstruire à partir des PDF
+    index=load_index(index_path)
     return({name:value for name,value in index.items() if value!={}})
 
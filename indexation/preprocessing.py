@@ -0,0 +1,78 @@
+"""
+Prétraitement du texte commun à l'indexation et aux requêtes : tokenisation, minuscules,
+suppression de la ponctuation et des mots vides, lemmatisation guidée par l'étiquetage morpho-syntaxique.
+
+Les ressources NLTK (mots vides, étiqueteur, lemmatiseur) sont chargées une seule fois par processus
+et les lemmes sont mis en cache par (token, catégorie WordNet) : un mot courant n'est lemmatisé
+qu'une fois. Une requête passe par exactement les mêmes fonctions que les documents, ses tokens
+sont donc ceux de l'index.
+NLTK n'est importé qu'au premier prétraitement (ou par warm_up).
+"""
+
+import threading
+from functools import lru_cache
+
+
+class NlpResources:
+
+    def __init__(self):
+        from nltk.tokenize import word_tokenize
+        from nltk.tag import PerceptronTagger
+        from nltk.stem import WordNetLemmatizer
+        from nltk.corpus import stopwords
+        self.word_tokenize = word_tokenize
+        self.stop_words = frozenset(stopwords.words('english'))
+        self.tagger = PerceptronTagger()
+        self.lemmatizer = WordNetLemmatizer()
+
+
+_resources = None
+_resources_lock = threading.Lock()
+
+
+def get_resources():
+    """Ressources NLTK partagées du processus."""
+    global _resources
+    if _resources is None:
+        with _resources_lock:
+            if _resources is None:
+                _resources = NlpResources()
+    return _resources
+
+
+def warm_up():
+    # Charge les ressources et les modèles chargés paresseusement par NLTK (tokeniseur de phrases, WordNet)
+    preprocess("Patients were treated with fulvestrant.")
+
+
+# Étiquette Penn Treebank (première lettre) -> catégorie WordNet (wordnet.ADJ, VERB, NOUN, ADV)
+WORDNET_POS = {'J': 'a', 'V': 'v', 'N': 'n', 'R': 'r'}
+
+
+def get_wordnet_pos(treebank_tag):
+    return WORDNET_POS.get(treebank_tag[:1], 'n')  # nom par défaut
+
+
+@lru_cache(maxsize=1 << 18)
+def lemma(token, pos):
+    return get_resources().lemmatizer.lemmatize(token, pos)
+
+
+def tokenize_and_clean(tokenized_text):
+    stop_words = get_resources().stop_words
+    tokens = (t.lower() for t in tokenized_text)
+    return [t for t in tokens if t.isalnum() and t not in stop_words]
+
+
+def lemmatize_tagged(tagged):
+    return [lemma(word, get_wordnet_pos(pos)) for word, pos in tagged]
+
+
+def lemmatization(text):
+    # Le flux entier est étiqueté d'un coup : le contexte d'un mot est le même qu'à l'indexation
+    return lemmatize_tagged(get_resources().tagger.tag(text))
+
+
+def preprocess(text):
+    """Texte brut -> tokens de l'index (dans l'ordre du texte)."""
+    return lemmatization(tokenize_and_clean(get_resources().word_tokenize(text)))
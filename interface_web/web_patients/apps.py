@@ -1,6 +1,16 @@
 from django.apps import AppConfig
 
+import sys
+from pathlib import Path
+
 
 class PatientsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'web_patients'
+
+    def ready(self):
+        # Chargement unique du moteur de recherche (index, guidelines, tables d'interaction, NLTK),
+        # en arrière-plan : le serveur démarre sans attendre et la première requête ne recharge rien
+        sys.path.append(str(Path(__file__).parent.parent.parent))
+        from affichage_web.search_engine import warm_up
+        warm_up()
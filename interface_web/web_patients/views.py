@@ -4,20 +4,18 @@ from django.shortcuts import render, redirect, reverse
 from django.conf import settings
 from django.http import HttpRequest, HttpResponse, JsonResponse
 import json
-import subprocess
 import os
 
 import sys
 from pathlib import Path
 
 sys.path.append(str(Path(__file__).parent.parent.parent))
-from affichage_web.text_response import json_message
+from affichage_web.search_engine import get_engine
 
 
 
 #vue correspondant à la page résultat
 def resultats_patient(request, patient_id):
-    guidelines_file = "../guidelines_metastatic.json"
     patient_file = os.path.join(settings.BASE_DIR, "../patients", f"patient_{patient_id[4:]}.json")
 
     if not os.path.exists(patient_file):
@@ -25,14 +23,10 @@ def resultats_patient(request, patient_id):
         return render(request, "patients/identifiant_non_utilise.html", {"patient_id": patient_id})
     
     else:
-        # Exécuter le script complet
-        cmd = ["python", "../treatment_recommender.py", guidelines_file, patient_file]
-        subprocess.run(cmd, check=True)
-        output_file = f"recommendations_{patient_id}.json"
-        json_message(output_file, patient_id)
-        affichage = f"affichage_{patient_id[4:]}.json"
-        with open(affichage, 'r', encoding='utf-8') as g:
-            data_affichage = json.load(g)
+        # Exécuter le pipeline complet en mémoire (recommandations, documents, interactions)
+        with open(patient_file, 'r', encoding='utf-8') as g:
+            patient = json.load(g)
+        data_affichage = get_engine().affichage(patient)
         affichage_bis = list(data_affichage.values())
 
 
@@ -0,0 +1,239 @@
+"""
+Index approximatif des plus proches voisins (IVF-PQ) pour les embeddings normalisés, en NumPy seul, sur CPU.
+
+Construction :
+    - k-means grossier : n_lists centroïdes ; chaque vecteur va dans la liste de son centroïde le plus proche ;
+    - quantification par produit du résidu (vecteur - centroïde) : m sous-espaces, 256 centroïdes chacun,
+      un vecteur est stocké sur m octets.
+Recherche (produit scalaire, égal au cosinus pour des vecteurs normalisés) :
+    q · x ≈ q · centroïde + Σ_j q_j · codebook_j[code_j] ; la table q_j · codebook_j est calculée une fois
+    par requête, seules les n_probe listes les plus proches sont parcourues, puis les `rerank` meilleurs
+    candidats sont re-notés exactement si les vecteurs d'origine sont fournis.
+n_probe et rerank règlent le compromis rappel / latence à la recherche, n_lists et m à la construction.
+L'index n'est valable que pour la matrice sur laquelle il a été construit (cf. matches) : après une
+reconstruction de l'index d'embeddings, il faut le reconstruire.
+
+Un index est un dossier (ann/ dans le dossier de l'index d'embeddings) :
+    params.json       {"n_lists", "m", "dim", "n_vectors", "fingerprint"}  (empreinte de la matrice d'origine)
+    coarse.npy        float32[n_lists, dim]
+    codebooks.npy     float32[m, 256, dim / m]
+    codes.npy         uint8[n_vectors, m]        codes rangés liste par liste
+    ids.npy           int64[n_vectors]           identifiant (ligne de la matrice d'origine) de chaque code
+    list_offsets.npy  int64[n_lists + 1]         début de chaque liste dans codes / ids
+
+Banc d'essai du rappel :
+    python pertinence/ann_index.py build --lists 1024 --m 48
+    python pertinence/ann_index.py bench --k 10 --probe 8 16 32
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+N_CENTROIDS = 256  # codes sur un octet
+TRAIN_SIZE = 1 << 16
+N_PROBE = 16
+RERANK = 100
+CHUNK_ROWS = 1 << 15
+FINGERPRINT_ROWS = 64
+
+
+def matrix_fingerprint(vectors):
+    """Empreinte courte d'une matrice : forme et FINGERPRINT_ROWS lignes réparties sur toute la matrice."""
+    sha = hashlib.sha1(repr(tuple(vectors.shape)).encode("utf-8"))
+    if len(vectors):
+        rows = np.unique(np.linspace(0, len(vectors) - 1, FINGERPRINT_ROWS).astype(np.int64))
+        sha.update(np.ascontiguousarray(vectors[rows], dtype=np.float32).tobytes())
+    return sha.hexdigest()[:16]
+
+
+def nearest_centroid(x, centroids):
+    """Centroïde le plus proche (distance euclidienne) de chaque ligne de x, par paquets de lignes."""
+    centroid_norms = (centroids * centroids).sum(axis=1)
+    result = np.empty(len(x), dtype=np.int64)
+    for start in range(0, len(x), CHUNK_ROWS):
+        block = np.asarray(x[start:start + CHUNK_ROWS], dtype=np.float32)
+        result[start:start + len(block)] = np.argmin(centroid_norms - 2 * block @ centroids.T, axis=1)
+    return result
+
+
+def kmeans(x, k, n_iter=15, seed=0):
+    """k-means de Lloyd ; un centroïde vide est réinitialisé sur un point tiré au hasard."""
+    rng = np.random.default_rng(seed)
+    x = np.asarray(x, dtype=np.float32)
+    centroids = x[rng.choice(len(x), k, replace=False)].copy()
+    for _ in range(n_iter):
+        assign = nearest_centroid(x, centroids)
+        counts = np.bincount(assign, minlength=k)
+        order = np.argsort(assign, kind="stable")
+        filled = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[filled]
+        centroids[filled] = np.add.reduceat(x[order], starts, axis=0) / counts[filled, None]
+        empty = np.flatnonzero(counts == 0)
+        centroids[empty] = x[rng.choice(len(x), len(empty), replace=False)]
+    return centroids
+
+
+class IVFPQIndex:
+
+    def __init__(self, coarse, codebooks, codes, ids, list_offsets, fingerprint=None):
+        self.fingerprint = fingerprint
+        self.coarse = coarse
+        self.codebooks = codebooks
+        self.codes = codes
+        self.ids = ids
+        self.list_offsets = list_offsets
+        self.n_lists, self.dim = coarse.shape
+        self.m = codebooks.shape[0]
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, vectors, n_lists=None, m=None, train_size=TRAIN_SIZE, seed=0):
+        """
+        vectors : float32[n, dim] normalisés (éventuellement en mémoire mappée).
+        n_lists : par défaut ~4√n ; m : nombre de sous-espaces (dim doit en être multiple), par défaut dim / 8.
+        """
+        n, dim = vectors.shape
+        m = m or max(1, dim // 8)
+        if dim % m:
+            raise ValueError(f"dim={dim} n'est pas multiple de m={m}")
+        rng = np.random.default_rng(seed)
+        sample = np.asarray(vectors[np.sort(rng.choice(n, min(n, train_size), replace=False))], dtype=np.float32)
+        n_lists = min(n_lists or max(1, int(4 * np.sqrt(n))), len(sample))
+
+        coarse = kmeans(sample, n_lists, seed=seed)
+        residuals = sample - coarse[nearest_centroid(sample, coarse)]
+        sub = dim // m
+        n_centroids = min(N_CENTROIDS, len(sample))
+        codebooks = np.stack([kmeans(residuals[:, j * sub:(j + 1) * sub], n_centroids, seed=seed + j)
+                              for j in range(m)])
+
+        # Codage de tous les vecteurs, par paquets de lignes
+        assign = nearest_centroid(vectors, coarse)
+        codes = np.empty((n, m), dtype=np.uint8)
+        for start in range(0, n, CHUNK_ROWS):
+            block = np.asarray(vectors[start:start + CHUNK_ROWS], dtype=np.float32) - coarse[assign[start:start + CHUNK_ROWS]]
+            for j in range(m):
+                codes[start:start + len(block), j] = nearest_centroid(block[:, j * sub:(j + 1) * sub], codebooks[j])
+
+        order = np.argsort(assign, kind="stable")
+        list_offsets = np.concatenate(([0], np.cumsum(np.bincount(assign, minlength=n_lists)))).astype(np.int64)
+        return cls(coarse, codebooks, codes[order], order.astype(np.int64), list_offsets, matrix_fingerprint(vectors))
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        for name in ("coarse", "codebooks", "codes", "ids", "list_offsets"):
+            np.save(os.path.join(path, name + ".npy"), getattr(self, name))
+        with open(os.path.join(path, "params.json"), "w", encoding="utf-8") as f:
+            json.dump({"n_lists": self.n_lists, "m": self.m, "dim": self.dim, "n_vectors": len(self),
+                       "fingerprint": self.fingerprint}, f)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Codes et identifiants en mémoire mappée ; centroïdes et codebooks (petits) en mémoire."""
+        mode = "r" if mmap else None
+        with open(os.path.join(path, "params.json"), "r", encoding="utf-8") as f:
+            params = json.load(f)
+        return cls(np.load(os.path.join(path, "coarse.npy")),
+                   np.load(os.path.join(path, "codebooks.npy")),
+                   np.load(os.path.join(path, "codes.npy"), mmap_mode=mode),
+                   np.load(os.path.join(path, "ids.npy"), mmap_mode=mode),
+                   np.load(os.path.join(path, "list_offsets.npy")),
+                   params.get("fingerprint"))
+
+    def matches(self, vectors):
+        """Vrai si l'index a été construit sur cette matrice (même nombre de vecteurs, même empreinte)."""
+        return len(self) == len(vectors) and self.fingerprint == matrix_fingerprint(vectors)
+
+    def search(self, query, k=10, n_probe=N_PROBE, rerank=RERANK, vectors=None):
+        """
+        Les k vecteurs de plus grand produit scalaire avec query : (ids, scores) triés.
+        vectors : matrice d'origine ; si fournie, les max(k, rerank) meilleurs candidats sont re-notés exactement.
+        """
+        query = np.asarray(query, dtype=np.float32)
+        coarse_scores = self.coarse @ query
+        n_probe = min(n_probe, self.n_lists)
+        lists = np.argpartition(-coarse_scores, n_probe - 1)[:n_probe]
+
+        # Table des produits scalaires sous-requête x centroïdes de chaque sous-espace
+        table = np.einsum("jcs,js->jc", self.codebooks, query.reshape(self.m, -1))
+        starts, ends = self.list_offsets[lists], self.list_offsets[lists + 1]
+        rows = np.concatenate([np.arange(a, b) for a, b in zip(starts, ends)]) if n_probe else np.zeros(0, np.int64)
+        if not len(rows):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        codes = np.asarray(self.codes[rows])
+        scores = np.repeat(coarse_scores[lists], ends - starts) + table[np.arange(self.m), codes].sum(axis=1)
+        ids = np.asarray(self.ids[rows])
+
+        keep = max(k, rerank) if vectors is not None else k
+        if keep < len(scores):
+            best = np.argpartition(-scores, keep - 1)[:keep]
+            ids, scores = ids[best], scores[best]
+        if vectors is not None:
+            order = np.argsort(ids)
+            ids = ids[order]
+            scores = np.asarray(vectors[ids], dtype=np.float32) @ query
+        order = np.argsort(-scores, kind="stable")[:k]
+        return ids[order], scores[order]
+
+
+def recall_at_k(ann, vectors, queries, k=10, n_probe=N_PROBE, rerank=RERANK):
+    """
+    Rappel@k moyen de l'index approximatif par rapport au score exact (produit matrice-vecteur),
+    et latences moyennes (secondes) des deux recherches.
+    """
+    recalls, ann_time, exact_time = [], 0.0, 0.0
+    for query in queries:
+        start = time.perf_counter()
+        exact_scores = np.asarray(vectors @ query)
+        exact = np.argpartition(-exact_scores, k - 1)[:k]
+        exact_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        found, _ = ann.search(query, k, n_probe, rerank, vectors)
+        ann_time += time.perf_counter() - start
+        recalls.append(len(np.intersect1d(found, exact)) / k)
+    return float(np.mean(recalls)), ann_time / len(queries), exact_time / len(queries)
+
+
+if __name__ == "__main__":
+    import argparse
+    from pertinence.embedding_index import EmbeddingIndex, EMBEDDINGS_PATH
+
+    parser = argparse.ArgumentParser(description="Index IVF-PQ de l'index d'embeddings (construction, banc d'essai)")
+    parser.add_argument("command", choices=["build", "bench"])
+    parser.add_argument("--path", default=EMBEDDINGS_PATH, help="dossier de l'index d'embeddings")
+    parser.add_argument("--lists", type=int, default=None)
+    parser.add_argument("--m", type=int, default=None)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--probe", type=int, nargs="+", default=[N_PROBE])
+    parser.add_argument("--rerank", type=int, default=RERANK)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    embeddings = EmbeddingIndex(args.path)
+    # L'index approximatif porte sur les passages s'il y en a, sinon sur les documents
+    matrix = embeddings.chunk_vectors if embeddings.chunked else embeddings.vectors
+    if args.command == "build":
+        start = time.perf_counter()
+        IVFPQIndex.build(matrix, args.lists, args.m).save(os.path.join(args.path, "ann"))
+        print(f"{len(matrix)} vecteurs indexés en {time.perf_counter() - start:.1f} s")
+    else:
+        ann = IVFPQIndex.load(os.path.join(args.path, "ann"))
+        # Requêtes : vecteurs de l'index légèrement bruités
+        rng = np.random.default_rng(0)
+        queries = np.asarray(matrix[rng.choice(len(matrix), min(args.queries, len(matrix)), replace=False)])
+        queries = queries + rng.normal(scale=0.05, size=queries.shape).astype(np.float32)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+        for n_probe in args.probe:
+            recall, ann_latency, exact_latency = recall_at_k(ann, matrix, queries, args.k, n_probe, args.rerank)
+            print(f"n_probe={n_probe:4d}  rappel@{args.k} = {recall:.3f}  "
+                  f"IVF-PQ {ann_latency * 1000:.1f} ms  exact {exact_latency * 1000:.1f} ms")
@@ -0,0 +1,226 @@
+"""
+Index d'embeddings des documents pour la recherche sémantique (llm_pertinence_v1.py).
+
+Un index est un dossier contenant :
+    vectors.npy    float32[n_docs, dim]   embeddings normalisés (norme 1), contigus ligne par ligne
+    docs.json      {"model": nom du modèle, "docs": [doc_name, ...]}  (identifiant = position)
+Index par passages (construit par indexation/embedding_builder.py), en plus :
+    chunk_vectors.npy float32[n_chunks, dim]  embeddings normalisés des passages, regroupés par document
+    chunks.npy        int32[n_chunks, 3]      (doc_id, page, offset du premier mot dans la page) de chaque passage
+    (vectors.npy contient alors la moyenne normalisée des passages de chaque document)
+
+La matrice est ouverte en mémoire mappée. Les vecteurs étant normalisés, la similarité cosinus
+d'une requête avec tous les documents est un seul produit matrice-vecteur ; les k meilleurs sont
+sélectionnés par argpartition. Avec des passages, le score d'un document est celui de son meilleur
+passage. Le modèle d'encodage est chargé une seule fois par processus.
+Si le dossier contient un index approximatif (ann/, cf. ann_index.py), search passe par lui au lieu
+de noter tous les vecteurs, à condition qu'il ait été construit sur la matrice actuelle ; sinon il est
+ignoré (recherche exacte). Réécrire les vecteurs supprime ann/.
+
+L'ancien fichier doc_embeddings.pkl ({doc_name: vecteur}) est converti au premier chargement.
+"""
+
+import os
+import json
+import pickle
+import shutil
+import threading
+
+import numpy as np
+
+from pertinence.ann_index import IVFPQIndex, N_PROBE, RERANK
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+EMBEDDINGS_PATH = os.path.join(BASE_DIR, "embeddings")
+LEGACY_EMBEDDINGS_PATH = os.path.join(BASE_DIR, "doc_embeddings.pkl")
+MODEL_NAME = "all-MiniLM-L6-v2"
+
+
+def normalize_rows(vectors):
+    """Copie float32 contiguë dont chaque ligne est de norme 1 (les lignes nulles restent nulles)."""
+    vectors = np.array(vectors, dtype=np.float32, ndmin=2, order="C")
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+
+def remove_ann(path=EMBEDDINGS_PATH):
+    # L'index approximatif désigne des lignes de l'ancienne matrice : à reconstruire (ann_index.py build)
+    ann_path = os.path.join(path, "ann")
+    if os.path.isdir(ann_path):
+        shutil.rmtree(ann_path)
+        print(f"Index approximatif supprimé (à reconstruire) : {ann_path}")
+
+
+def save_embedding_index(doc_embeddings, path=EMBEDDINGS_PATH, model_name=MODEL_NAME):
+    """Écrit {doc_name: vecteur} au format de l'index (vecteurs normalisés)."""
+    os.makedirs(path, exist_ok=True)
+    remove_ann(path)
+    names = list(doc_embeddings)
+    vectors = normalize_rows([doc_embeddings[name] for name in names]) if names else np.zeros((0, 0), np.float32)
+    np.save(os.path.join(path, "vectors.npy"), vectors)
+    with open(os.path.join(path, "docs.json"), "w", encoding="utf-8") as f:
+        json.dump({"model": model_name, "docs": names}, f, ensure_ascii=False)
+
+
+def save_chunked_index(doc_names, chunk_vectors, chunks, path=EMBEDDINGS_PATH, model_name=MODEL_NAME):
+    """
+    Écrit un index par passages. chunks : int32[n_chunks, 3] (doc_id, page, offset), trié par doc_id ;
+    chaque document de doc_names doit avoir au moins un passage.
+    """
+    os.makedirs(path, exist_ok=True)
+    remove_ann(path)
+    chunk_vectors = normalize_rows(chunk_vectors)
+    chunks = np.asarray(chunks, dtype=np.int32).reshape(-1, 3)
+    starts = np.searchsorted(chunks[:, 0], np.arange(len(doc_names)))
+    doc_vectors = normalize_rows(np.add.reduceat(chunk_vectors, starts, axis=0)) if len(doc_names) else chunk_vectors[:0]
+    np.save(os.path.join(path, "chunk_vectors.npy"), chunk_vectors)
+    np.save(os.path.join(path, "chunks.npy"), chunks)
+    np.save(os.path.join(path, "vectors.npy"), doc_vectors)
+    with open(os.path.join(path, "docs.json"), "w", encoding="utf-8") as f:
+        json.dump({"model": model_name, "docs": list(doc_names)}, f, ensure_ascii=False)
+
+
+def convert_pickle(pickle_path=LEGACY_EMBEDDINGS_PATH, path=EMBEDDINGS_PATH, model_name=MODEL_NAME):
+    with open(pickle_path, "rb") as f:
+        save_embedding_index(pickle.load(f), path, model_name)
+
+
+class EmbeddingIndex:
+
+    def __init__(self, path=EMBEDDINGS_PATH, mmap=True, use_ann=True, n_probe=N_PROBE, rerank=RERANK):
+        # n_probe, rerank : réglages rappel / latence de l'index approximatif (cf. IVFPQIndex.search)
+        self.path = path
+        self.n_probe, self.rerank = n_probe, rerank
+        with open(os.path.join(path, "docs.json"), "r", encoding="utf-8") as f:
+            table = json.load(f)
+        self.model_name = table["model"]
+        self.doc_names = table["docs"]
+        self.doc_ids = {name: i for i, name in enumerate(self.doc_names)}
+        mode = "r" if mmap else None
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode=mode)
+
+        chunks_path = os.path.join(path, "chunks.npy")
+        self.chunked = os.path.exists(chunks_path)
+        if self.chunked:
+            self.chunk_vectors = np.load(os.path.join(path, "chunk_vectors.npy"), mmap_mode=mode)
+            self.chunks = np.load(chunks_path, mmap_mode=mode)
+            # Premier passage de chaque document (les passages sont regroupés par document)
+            self.chunk_starts = np.searchsorted(self.chunks[:, 0], np.arange(len(self.doc_names)))
+
+        ann_path = os.path.join(path, "ann")
+        self.ann = IVFPQIndex.load(ann_path, mmap) if use_ann and os.path.exists(os.path.join(ann_path, "params.json")) else None
+        if self.ann is not None and not self.ann.matches(self.chunk_vectors if self.chunked else self.vectors):
+            # Construit sur une autre matrice (index d'embeddings reconstruit depuis) : ses identifiants sont faux
+            print(f"Index approximatif périmé ignoré (recherche exacte) : {ann_path}")
+            self.ann = None
+
+    def __len__(self):
+        return len(self.doc_names)
+
+    def scores(self, query_vector):
+        """
+        Similarité cosinus entre la requête et chaque document (tableau aligné sur doc_names) ;
+        index par passages : similarité du meilleur passage du document.
+        """
+        query = normalize_rows(query_vector)[0]
+        if not self.chunked:
+            return self.vectors @ query
+        if not len(self.doc_names):
+            return np.zeros(0, dtype=np.float32)
+        return np.maximum.reduceat(self.chunk_vectors @ query, self.chunk_starts)
+
+    def best_passage(self, doc_id, query_vector):
+        """(page, offset, score) du passage du document le plus proche de la requête (index par passages)."""
+        query = normalize_rows(query_vector)[0]
+        start = self.chunk_starts[doc_id]
+        end = self.chunk_starts[doc_id + 1] if doc_id + 1 < len(self.doc_names) else len(self.chunks)
+        scores = self.chunk_vectors[start:end] @ query
+        best = int(np.argmax(scores))
+        return int(self.chunks[start + best, 1]), int(self.chunks[start + best, 2]), float(scores[best])
+
+    def search(self, query_vector, k=5):
+        """
+        Les k documents les plus proches : (doc_ids, scores) triés par score décroissant,
+        égalités dans l'ordre de la table des documents.
+        """
+        if self.ann is not None:
+            return self._search_ann(query_vector, k)
+        scores = self.scores(query_vector)
+        keys = -scores
+        if 0 < k < len(keys):
+            # Tous les documents au moins aussi bons que le k-ième (égalités comprises), puis tri de ceux-là seulement
+            kth = keys[np.argpartition(keys, k - 1)[k - 1]]
+            candidates = np.flatnonzero(keys <= kth)
+            order = candidates[np.argsort(keys[candidates], kind="stable")][:k]
+        else:
+            order = np.argsort(keys, kind="stable")[:max(k, 0)]
+        return order, scores[order]
+
+    def _search_ann(self, query_vector, k):
+        query = normalize_rows(query_vector)[0]
+        if not self.chunked:
+            return self.ann.search(query, k, self.n_probe, self.rerank, self.vectors)
+        # Meilleurs passages (re-notés exactement), puis meilleur passage de chaque document
+        ids, scores = self.ann.search(query, max(self.rerank, 10 * k), self.n_probe, self.rerank, self.chunk_vectors)
+        docs = np.asarray(self.chunks[ids, 0], dtype=np.int64)
+        _, first = np.unique(docs, return_index=True)
+        first = np.sort(first)[:k]
+        return docs[first], scores[first]
+
+    def similarity_block(self, doc_ids):
+        """Similarités cosinus deux à deux entre les documents doc_ids (un seul produit matriciel)."""
+        vectors = self.vectors[np.asarray(doc_ids, dtype=np.int64)]
+        return vectors @ vectors.T
+
+    def non_redundant(self, doc_ids, threshold=0.9):
+        """
+        Filtre glouton de redondance : les documents sont pris dans l'ordre donné, et un document est écarté
+        si sa similarité avec un document déjà retenu dépasse threshold. Retourne les positions retenues.
+        """
+        block = self.similarity_block(doc_ids)
+        kept = []
+        for i in range(len(doc_ids)):
+            if not kept or block[i, kept].max() <= threshold:
+                kept.append(i)
+        return kept
+
+
+def load_embedding_index(path=EMBEDDINGS_PATH, pickle_path=LEGACY_EMBEDDINGS_PATH, mmap=True):
+    """Ouvre l'index ; s'il n'existe pas encore, le construit à partir de l'ancien doc_embeddings.pkl."""
+    if not os.path.exists(os.path.join(path, "vectors.npy")) and os.path.exists(pickle_path):
+        convert_pickle(pickle_path, path)
+    return EmbeddingIndex(path, mmap=mmap)
+
+
+_index = None
+_model = None
+_index_lock = threading.Lock()
+_model_lock = threading.Lock()
+
+
+def get_embedding_index():
+    """Index partagé du processus."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = load_embedding_index()
+    return _index
+
+
+def get_model(model_name=MODEL_NAME):
+    """Modèle d'encodage partagé du processus (sentence-transformers importé au premier appel, sur CPU si besoin)."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                from sentence_transformers import SentenceTransformer
+                _model = SentenceTransformer(model_name)
+    return _model
+
+
+def encode_query(text, model=None):
+    """Embedding normalisé (float32) d'une requête."""
+    model = model if model is not None else get_model()
+    return normalize_rows(model.encode(text))[0]
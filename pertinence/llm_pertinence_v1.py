@@ -1,23 +1,18 @@
 import sys
-import pickle
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
 import re
 import os
-import fitz  
-from pathlib import Path
-
-MODEL_NAME = "all-MiniLM-L6-v2"
-EMBEDDINGS_FILE = "doc_embeddings.pkl"
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from indexation.compact_index import load_doc_table
+from indexation.doc_metadata import NO_DATE
+from pertinence.embedding_index import get_embedding_index, get_model, encode_query
 
 def process_patient_file(patient_file):
+    # Index des embeddings (matrice normalisée en mémoire mappée) et modèle, chargés une seule fois par processus
     print("Chargement du modèle d'embedding pour la requête...")
-    model = SentenceTransformer(MODEL_NAME)
-    # Chargement des embeddings des documents
-    with open(EMBEDDINGS_FILE, "rb") as f:
-        doc_embeddings = pickle.load(f)
-    doc_names = list(doc_embeddings.keys())
-    doc_vectors = list(doc_embeddings.values())
+    embeddings = get_embedding_index()
+    model = get_model(embeddings.model_name)
+    # Métadonnées (date, année) extraites à l'indexation : pas de lecture de PDF ici
+    doc_table = load_doc_table()
     print("Bienvenue ! Tapez vos mots-clés pour rechercher les articles pertinents (ou 'exit' pour quitter).")
 
     # Fonction pour générer une requête optimisée (version ultra simplifiée sans LLM)
@@ -77,11 +72,9 @@ def process_patient_file(patient_file):
     query = generate_optimized_query(weighted_query)
     print(f"\nRequête générée : {query}\n")
 
-    query_embedding = model.encode(query)
-    similarities = cosine_similarity([query_embedding], doc_vectors)[0]
-
-    # Top 5 documents
-    top_docs = sorted(zip(doc_names, similarities), key=lambda x: x[1], reverse=True)[:5]
+    # Top 5 documents : un produit matrice-vecteur et une sélection partielle
+    doc_ids, similarities = embeddings.search(encode_query(query, model), 5)
+    top_docs = [(embeddings.doc_names[d], float(s)) for d, s in zip(doc_ids, similarities)]
 
     # --- Analyse métadonnées sémantiques et temporelles ---
     import datetime
@@ -101,13 +94,9 @@ def process_patient_file(patient_file):
     VALIDATION_THRESHOLD = 0.2
     NON_REDUNDANCY_THRESHOLD = 0.9
 
-    validated_docs = []
-    for name, score in top_docs:
-        year_str = extract_first_date(str(Path("pubmed_articles") / name))
-        try:
-            year = int(re.search(r"\d{4}", year_str).group()) if year_str else None
-        except:
-            year = None
+    validated = []
+    for position, (name, score) in enumerate(top_docs):
+        year = doc_table.get(name, {}).get("year")
 
         if year and year < 2015:
             continue  # on ignore les vieux documents
@@ -115,69 +104,35 @@ def process_patient_file(patient_file):
         if score < VALIDATION_THRESHOLD:
             continue
 
-        combined_score = score * recency_weight(year, current_year)
+        validated.append((position, name, score * recency_weight(year, current_year)))
 
-        is_redundant = any(
-            cosine_similarity([doc_embeddings[name]], [doc_embeddings[existing]])[0][0] > NON_REDUNDANCY_THRESHOLD
-            for existing, _ in validated_docs
-        )
-        if not is_redundant:
-            validated_docs.append((name, combined_score))
+    # Redondance : similarités entre documents validés calculées en un seul bloc
+    kept = embeddings.non_redundant([doc_ids[position] for position, _, _ in validated], NON_REDUNDANCY_THRESHOLD)
+    validated_docs = [validated[i][1:] for i in kept]
 
     # trier les documents validés par score combiné
     validated_docs = sorted(validated_docs, key=lambda x: x[1], reverse=True)
 
     print("Top documents les plus pertinents :")
     for name, combined_score in validated_docs:
-        pdf_path = Path("pubmed_articles") / name
-        publication_date = extract_first_date(str(pdf_path))
+        publication_date = doc_table.get(name, {}).get("date", NO_DATE)
         print(f"{name} → Date : {publication_date} | Score combiné : {combined_score:.4f}")
 
     if not validated_docs:
         print("⚠️ Aucun document validé. Voici les scores et années des documents proposés :")
         for name, score in top_docs:
-            year = extract_year_from_filename(name)
+            year = doc_table.get(name, {}).get("year")
             adjusted_score = score * recency_weight(year, current_year)
             print(f"{name} ({year}) → Score : {score:.4f} | Score ajusté : {adjusted_score:.4f}")
 
-def extract_first_date(pdf_path):
-    doc = fitz.open(pdf_path)
-    text_all = ""
-    
-    # Parcours des 2 premières pages pour trouver la date
-    for page_num in range(min(2, len(doc))):
-        page = doc[page_num]
-        text_all += page.get_text() + "\n"
-    
-    doc.close()
-
-    # Normaliser le texte
-    text_all_lower = text_all.lower()
-
-    # Mots-clés typiques qui précèdent la date
-    keywords = ["received", "accepted", "published", "available online"]
-    date_regex = r'(\d{1,2}\s+\w+\s+\d{4}|\w+\s+\d{4}|\d{4})'
-    
-    for keyword in keywords:
-        idx = text_all_lower.find(keyword)
-        if idx != -1:
-            snippet = text_all[idx:idx+100]
-            match = re.search(date_regex, snippet)
-            if match:
-                return match.group(0).strip()
-    
-    return "Aucune date trouvée."
-
 
 # Ancienne boucle interactive déplacée dans une fonction si besoin
 def main_interactive():
     print("Chargement du modèle d'embedding pour la requête...")
-    model = SentenceTransformer(MODEL_NAME)
-    # Chargement des embeddings des documents
-    with open(EMBEDDINGS_FILE, "rb") as f:
-        doc_embeddings = pickle.load(f)
-    doc_names = list(doc_embeddings.keys())
-    doc_vectors = list(doc_embeddings.values())
+    embeddings = get_embedding_index()
+    model = get_model(embeddings.model_name)
+    # Années extraites à l'indexation (un PMID ne code pas l'année de publication)
+    doc_table = load_doc_table()
     print("Bienvenue ! Tapez vos mots-clés pour rechercher les articles pertinents (ou 'exit' pour quitter).")
 
     def generate_optimized_query(keywords):
@@ -229,18 +184,9 @@ def main_interactive():
         query = generate_optimized_query(weighted_query)
         print(f"\nRequête générée : {query}\n")
 
-        query_embedding = model.encode(query)
-        similarities = cosine_similarity([query_embedding], doc_vectors)[0]
-        top_docs = sorted(zip(doc_names, similarities), key=lambda x: x[1], reverse=True)[:5]
+        doc_ids, similarities = embeddings.search(encode_query(query, model), 5)
+        top_docs = [(embeddings.doc_names[d], float(s)) for d, s in zip(doc_ids, similarities)]
         import datetime
-        def extract_year_from_filename(name):
-            match = re.search(r'PMID_(\d{8})', name)
-            if match:
-                pmid = match.group(1)
-                year_prefix = int(pmid[:2])
-                year = 2000 + (year_prefix if year_prefix < 50 else year_prefix - 100)
-                return year
-            return None
         current_year = datetime.datetime.now().year
         def recency_weight(year, current_year, min_year=2015):
             if not year or year < min_year:
@@ -248,29 +194,25 @@ def main_interactive():
             return 0.5 + 0.5 * ((year - min_year) / (current_year - min_year)) if current_year > min_year else 1.0
         VALIDATION_THRESHOLD = 0.2
         NON_REDUNDANCY_THRESHOLD = 0.9
-        validated_docs = []
-        for name, score in top_docs:
-            year = extract_year_from_filename(name)
+        validated = []
+        for position, (name, score) in enumerate(top_docs):
+            year = doc_table.get(name, {}).get("year")
             if year and year < 2015:
                 continue
             if score < VALIDATION_THRESHOLD:
                 continue
-            combined_score = score * recency_weight(year, current_year)
-            is_redundant = any(
-                cosine_similarity([doc_embeddings[name]], [doc_embeddings[existing]])[0][0] > NON_REDUNDANCY_THRESHOLD
-                for existing, _ in validated_docs
-            )
-            if not is_redundant:
-                validated_docs.append((name, combined_score))
+            validated.append((position, name, score * recency_weight(year, current_year)))
+        kept = embeddings.non_redundant([doc_ids[position] for position, _, _ in validated], NON_REDUNDANCY_THRESHOLD)
+        validated_docs = [validated[i][1:] for i in kept]
         validated_docs = sorted(validated_docs, key=lambda x: x[1], reverse=True)
         print("Top documents les plus pertinents :")
         for name, combined_score in validated_docs:
-            year = extract_year_from_filename(name)
+            year = doc_table.get(name, {}).get("year")
             print(f"{name} ({year}) → Score combiné : {combined_score:.4f}")
         if not validated_docs:
             print("Aucun document validé. Voici les scores et années des documents proposés :")
             for name, score in top_docs:
-                year = extract_year_from_filename(name)
+                year = doc_table.get(name, {}).get("year")
                 adjusted_score = score * recency_weight(year, current_year)
                 print(f"{name} ({year}) → Score : {score:.4f} | Score ajusté : {adjusted_score:.4f}")
 
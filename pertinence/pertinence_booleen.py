@@ -1,22 +1,261 @@
-def boolean_search(query_tokens, enriched_index, min_match=2):
+"""
+Recherche booléenne sur l'index compact (indexation/compact_index.py).
+
+Les postings d'un terme sont les identifiants de documents triés, avec des pointeurs de saut
+tous les ~√n postings : une intersection avance dans la liste la plus longue par sauts (recherche
+du bloc, puis recherche dans le bloc) au lieu de la parcourir en entier.
+
+Requêtes : AND, OR, NOT, parenthèses, expressions entre guillemets (contrainte de phrase) et
+nombre minimal de termes optionnels (min_should_match), par exemple
+    alpelisib AND (pik3ca OR akt1) AND NOT everolimus
+    "breast cancer" fulvestrant          (AND implicite entre deux opérandes)
+Les termes doivent être sous la forme de l'index (minuscules, lemmatisés).
+Si l'index a les positions (indexation.py --positions), une phrase est vérifiée mot à mot
+(cf. pertinence_phrase.py) ; sinon elle est approchée par l'intersection de ses termes.
+"""
+
+import os
+import sys
+import re
+import math
+import heapq
+import bisect
+from functools import lru_cache
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from indexation.compact_index import load_index, INDEX_PATH
+from pertinence.pertinence_phrase import phrase_matches
+
+
+class PostingList:
+    """Identifiants de documents triés d'un terme (et leurs tf), avec pointeurs de saut."""
+
+    def __init__(self, doc_ids, tfs):
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.step = max(1, int(math.sqrt(len(doc_ids))))
+        # Premier identifiant de chaque bloc de step postings
+        self.skips = doc_ids[::self.step]
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def advance(self, target, pos=0):
+        """Première position >= pos dont le document est >= target : saut au bon bloc, puis recherche dans le bloc."""
+        first_block = pos // self.step
+        block = max(first_block, bisect.bisect_right(self.skips, target, lo=first_block) - 1)
+        start = max(pos, block * self.step)
+        end = min(len(self.doc_ids), (block + 1) * self.step)
+        return bisect.bisect_left(self.doc_ids, target, start, end)
+
+
+def intersect(doc_ids, postings):
+    """Documents de doc_ids (triés) présents dans postings."""
+    result = []
+    ids, n = postings.doc_ids, len(postings)
+    pos = 0
+    for doc in doc_ids:
+        # Saut seulement si le posting courant est en retard sur doc
+        if pos < n and ids[pos] < doc:
+            pos = postings.advance(doc, pos)
+        if pos == n:
+            break
+        if ids[pos] == doc:
+            result.append(doc)
+    return result
+
+
+def difference(doc_ids, postings):
+    """Documents de doc_ids (triés) absents de postings."""
+    result = []
+    ids, n = postings.doc_ids, len(postings)
+    pos = 0
+    for doc in doc_ids:
+        if pos < n and ids[pos] < doc:
+            pos = postings.advance(doc, pos)
+        if pos == n or ids[pos] != doc:
+            result.append(doc)
+    return result
+
+
+def at_least(lists, min_match):
+    """Fusion de listes triées : documents présents dans au moins min_match d'entre elles."""
+    result = []
+    current, count = None, 0
+    for doc in heapq.merge(*lists):
+        if doc != current:
+            if current is not None and count >= min_match:
+                result.append(current)
+            current, count = doc, 0
+        count += 1
+    if current is not None and count >= min_match:
+        result.append(current)
+    return result
+
+
+# --- Requêtes : arbre ("TERM", t) | ("PHRASE", [t...]) | ("AND", [...]) | ("OR", [...], min_match) | ("NOT", noeud) ---
+
+TOKEN_RE = re.compile(r'"[^"]*"|\(|\)|[^\s()"]+')
+
+
+def parse_query(query, normalize=str.lower):
+    """Analyse une requête texte ; priorité NOT > AND > OR, AND implicite entre deux opérandes."""
+    tokens = TOKEN_RE.findall(query)
+    pos = 0
+
+    def peek():
+        return tokens[pos] if pos < len(tokens) else None
+
+    def parse_or():
+        nonlocal pos
+        children = [parse_and()]
+        while peek() == "OR":
+            pos += 1
+            children.append(parse_and())
+        return children[0] if len(children) == 1 else ("OR", children, 1)
+
+    def parse_and():
+        nonlocal pos
+        children = [parse_not()]
+        while peek() not in (None, ")", "OR"):
+            if peek() == "AND":
+                pos += 1
+            children.append(parse_not())
+        return children[0] if len(children) == 1 else ("AND", children)
+
+    def parse_not():
+        nonlocal pos
+        if peek() == "NOT":
+            pos += 1
+            return ("NOT", parse_not())
+        return parse_operand()
+
+    def parse_operand():
+        nonlocal pos
+        token = peek()
+        if token is None:
+            raise ValueError(f"Requête incomplète : {query!r}")
+        if token in (")", "AND", "OR"):
+            raise ValueError(f"Jeton inattendu {token!r} dans {query!r}")
+        pos += 1
+        if token == "(":
+            node = parse_or()
+            if peek() != ")":
+                raise ValueError(f"Parenthèse non fermée : {query!r}")
+            pos += 1
+            return node
+        if token.startswith('"'):
+            return ("PHRASE", [normalize(t) for t in token.strip('"').split()])
+        return ("TERM", normalize(token))
+
+    node = parse_or()
+    if peek() is not None:
+        raise ValueError(f"Jeton inattendu {peek()!r} dans {query!r}")
+    return node
+
+
+def boolean_query(must=(), should=(), must_not=(), min_should_match=1, phrases=()):
+    """Construit l'arbre d'une requête structurée (termes obligatoires, optionnels, exclus, phrases)."""
+    children = [("TERM", t) for t in must] + [("PHRASE", list(p)) for p in phrases]
+    if should:
+        children.append(("OR", [("TERM", t) for t in should], min_should_match))
+    children += [("NOT", ("TERM", t)) for t in must_not]
+    return ("AND", children)
+
+
+def query_terms(node):
+    """Termes positifs de la requête (ceux sous un NOT sont exclus), pour le classement."""
+    kind = node[0]
+    if kind == "TERM":
+        return [node[1]]
+    if kind == "PHRASE":
+        return list(node[1])
+    if kind == "NOT":
+        return []
+    return [t for child in node[1] for t in query_terms(child)]
+
+
+class BooleanSearchEngine:
+
+    def __init__(self, index):
+        self.index = index
+        self.all_docs = list(range(index.n_docs))
+        self.postings = lru_cache(maxsize=4096)(self.postings)
+
+    def postings(self, term):
+        if term not in self.index:
+            return PostingList([], [])
+        doc_ids, tfs = self.index.postings(term)
+        return PostingList(doc_ids.tolist(), tfs.tolist())
+
+    def _as_postings(self, node):
+        # Un terme garde ses pointeurs de saut en cache ; un sous-résultat est transformé en liste de postings
+        if node[0] == "TERM":
+            return self.postings(node[1])
+        return PostingList(self.evaluate(node), [])
+
+    def _intersect_all(self, lists):
+        # La liste la plus courte d'abord : les autres sont parcourues par sauts
+        lists = sorted(lists, key=len)
+        result = lists[0].doc_ids
+        for postings in lists[1:]:
+            result = intersect(result, postings)
+        return result
+
+    def evaluate(self, node):
+        """Identifiants (triés) des documents qui satisfont la requête."""
+        kind = node[0]
+        if kind == "TERM":
+            return self.postings(node[1]).doc_ids
+        if kind == "PHRASE":
+            if not node[1]:
+                return []
+            docs = self._intersect_all([self.postings(t) for t in node[1]])
+            if len(node[1]) < 2 or not self.index.has_positions:
+                return docs
+            exact = phrase_matches(self.index, node[1])
+            return [doc for doc in docs if exact.get(doc)]
+        if kind == "NOT":
+            return difference(self.all_docs, self._as_postings(node[1]))
+        if kind == "OR":
+            children, min_match = node[1], node[2]
+            return at_least([self.evaluate(child) for child in children], min_match)
+
+        # AND : opérandes positifs intersectés, opérandes NOT retirés ensuite
+        positives = [child for child in node[1] if child[0] != "NOT"]
+        negatives = [child[1] for child in node[1] if child[0] == "NOT"]
+        if positives:
+            result = self._intersect_all([self._as_postings(child) for child in positives])
+        else:
+            result = self.all_docs
+        for child in negatives:
+            result = difference(result, self._as_postings(child))
+        return result
+
+    def search(self, query, k=5):
+        """Documents satisfaisant la requête (texte ou arbre), classés par rank_by_tf : [(doc_name, score), ...]."""
+        node = parse_query(query) if isinstance(query, str) else query
+        matching = [self.index.doc_names[d] for d in self.evaluate(node)]
+        return rank_by_tf(query_terms(node), matching, self.index, k)
+
+
+def boolean_search(query_tokens, enriched_index, min_match=2, k=5):
     """
-    Recherche booléenne souple : retourne les documents qui contiennent au moins `min_match` termes de la requête.
+    Recherche booléenne souple : documents qui contiennent au moins `min_match` termes de la requête,
+    classés par rank_by_tf (les k meilleurs).
     """
-    from collections import Counter
-
-    doc_counter = Counter()
+    engine = enriched_index if isinstance(enriched_index, BooleanSearchEngine) else BooleanSearchEngine(enriched_index)
+    return engine.search(("OR", [("TERM", t) for t in dict.fromkeys(query_tokens)], min_match), k)
 
-    for term in query_tokens:
-        if term in enriched_index:
-            doc_counter.update(enriched_index[term].keys())
 
-    matching_docs = [doc for doc, count in doc_counter.items() if count >= min_match]
-    return sorted(matching_docs)[:5]
+def rank_by_tf(query_terms, matching_docs, index, k=5):
+    """Les k documents avec la plus grande somme des tf des termes de la requête (tas borné)."""
+    query_terms = [term for term in query_terms if term in index]
+    scores = ((doc, sum(index[term][doc][0] for term in query_terms if doc in index[term])) for doc in matching_docs)
+    return heapq.nlargest(k, scores, key=lambda x: x[1])
 
 
-def rank_by_tf(query_terms, matching_docs, index):
-    scores = []
-    for doc in matching_docs:
-        score = sum(index[term][doc][0] for term in query_terms if doc in index.get(term, {}))
-        scores.append((doc, score))
-    return sorted(scores, key=lambda x: x[1], reverse=True)[:5]
\ No newline at end of file
+if __name__ == "__main__":
+    engine = BooleanSearchEngine(load_index(INDEX_PATH))
+    for doc, score in engine.search(" ".join(sys.argv[1:]) or "fulvestrant AND NOT everolimus"):
+        print(f"{doc} → tf : {score}")
@@ -0,0 +1,152 @@
+"""
+Recherche hybride : BM25 (lexical, pertinence_proba.py) et embeddings (sémantique, embedding_index.py)
+lancés en parallèle pour chaque recommandation, puis fusionnés en un seul classement.
+
+Fusions :
+    "rrf"      reciprocal rank fusion : score = Σ poids / (k_rrf + rang), insensible à l'échelle des scores ;
+    "weighted" normalisation min-max des scores de chaque signal puis somme pondérée.
+Chaque signal ne classe que ses `depth` meilleurs documents. Le résultat garde, pour chaque document,
+le score de chaque signal (None si le signal ne l'a pas retenu).
+"""
+
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from indexation.compact_index import load_index, INDEX_PATH
+from pertinence.pertinence_vectorielle import requetes_patient
+from pertinence.pertinence_proba import BM25, rank_documents_bm25
+from pertinence.pertinence_phrase import phrase_boosts
+from pertinence.embedding_index import get_embedding_index, get_model, encode_query
+
+DEPTH = 50
+K_RRF = 60
+SIGNALS = ("bm25", "embedding")
+
+
+def rrf_fusion(rankings, weights=None, k_rrf=K_RRF):
+    """rankings : {signal: [(doc, score), ...] trié} -> {doc: score fusionné}."""
+    weights = weights or {}
+    fused = {}
+    for signal, ranking in rankings.items():
+        weight = weights.get(signal, 1.0)
+        for rank, (doc, _) in enumerate(ranking, start=1):
+            fused[doc] = fused.get(doc, 0.0) + weight / (k_rrf + rank)
+    return fused
+
+
+def weighted_fusion(rankings, weights=None):
+    """rankings : {signal: [(doc, score), ...]} -> {doc: Σ poids * score normalisé dans [0, 1]}."""
+    weights = weights or {}
+    fused = {}
+    for signal, ranking in rankings.items():
+        if not ranking:
+            continue
+        weight = weights.get(signal, 1.0)
+        scores = [score for _, score in ranking]
+        low, high = min(scores), max(scores)
+        for doc, score in ranking:
+            normalized = (score - low) / (high - low) if high > low else 1.0
+            fused[doc] = fused.get(doc, 0.0) + weight * normalized
+    return fused
+
+
+FUSIONS = {"rrf": rrf_fusion, "weighted": weighted_fusion}
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Pool de threads partagé du processus (encodage et produits matriciels relâchent le GIL)."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="hybride")
+    return _executor
+
+
+class HybridRetriever:
+
+    def __init__(self, bm25, embeddings, model=None, fusion="rrf", weights=None, depth=DEPTH):
+        if fusion not in FUSIONS:
+            raise ValueError(f"Fusion inconnue : {fusion}")
+        self.bm25 = bm25
+        self.embeddings = embeddings
+        self.model = model
+        self.fusion = fusion
+        self.weights = weights
+        self.depth = depth
+
+    def _bm25(self, query_tokens, phrases):
+        return rank_documents_bm25(query_tokens, self.bm25, self.depth, phrase_boosts(self.bm25.index, phrases))
+
+    def _embedding(self, query_text):
+        model = self.model if self.model is not None else get_model(self.embeddings.model_name)
+        doc_ids, scores = self.embeddings.search(encode_query(query_text, model), self.depth)
+        return [(self.embeddings.doc_names[d], float(s)) for d, s in zip(doc_ids, scores)]
+
+    def rank(self, query_tokens, query_text, phrases=(), top_k=None):
+        """
+        Les deux signaux en parallèle, puis fusion : [(doc_name, score fusionné, {signal: score}), ...]
+        trié par score fusionné décroissant (égalités : meilleur rang BM25, puis nom).
+        """
+        executor = get_executor()
+        bm25_future = executor.submit(self._bm25, query_tokens, phrases)
+        embedding_future = executor.submit(self._embedding, query_text)
+        rankings = {"bm25": bm25_future.result(), "embedding": embedding_future.result()}
+
+        fused = FUSIONS[self.fusion](rankings, self.weights)
+        signals = {doc: dict.fromkeys(SIGNALS) for doc in fused}
+        for signal, ranking in rankings.items():
+            for doc, score in ranking:
+                signals[doc][signal] = score
+        bm25_rank = {doc: rank for rank, (doc, _) in enumerate(rankings["bm25"])}
+        order = sorted(fused, key=lambda doc: (-round(fused[doc], 12), bm25_rank.get(doc, len(bm25_rank)), doc))
+        return [(doc, fused[doc], signals[doc]) for doc in order[:top_k]]
+
+
+def load_retriever(index_path=INDEX_PATH, fusion="rrf", weights=None, depth=DEPTH):
+    return HybridRetriever(BM25(load_index(index_path)), get_embedding_index(), fusion=fusion, weights=weights, depth=depth)
+
+
+# filename : chemin du fichier de recommandations, ou le dictionnaire déjà en mémoire
+def doc_pertinents_hybride(filename, retriever=None, top_k=None):
+    """
+    Même sortie que doc_pertinents_vectoriel (results : [(doc, score fusionné), ...]),
+    avec en plus signals : {doc: {"bm25": score, "embedding": score}}.
+    """
+    requetes = requetes_patient(filename)
+    if requetes and retriever is None:
+        retriever = load_retriever()
+    all_results = []
+    for treatment, node_path, query_tokens, phrases, query_text in requetes:
+        ranked = retriever.rank(query_tokens, query_text, phrases, top_k)
+        all_results.append({
+            "treatment": treatment,
+            "node_path": node_path,
+            "results": [(doc, score) for doc, score, _ in ranked],
+            "signals": {doc: signals for doc, _, signals in ranked},
+        })
+    return all_results
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Classement hybride BM25 + embeddings d'un fichier de recommandations")
+    parser.add_argument("recommendations", nargs="?", default="../recommendations/recommendations_MBC_005.json")
+    parser.add_argument("--fusion", choices=sorted(FUSIONS), default="rrf")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    for reco in doc_pertinents_hybride(args.recommendations, load_retriever(fusion=args.fusion), top_k=args.top):
+        print(f"\nTraitement proposé : {reco['treatment']}")
+        print(f"Chemin de décision : {reco['node_path']}")
+        for doc, score in reco["results"]:
+            detail = ", ".join(f"{signal} {value:.4f}" if value is not None else f"{signal} -"
+                               for signal, value in reco["signals"][doc].items())
+            print(f"{doc} → Score : {score:.4f} ({detail})")
@@ -0,0 +1,97 @@
+"""
+Phrases et proximité sur l'index positionnel (indexation.py --positions, cf. compact_index.py).
+
+Les mots-clés de plusieurs mots ("sacituzumab govitecan", "selective estrogen receptor degrader")
+sont découpés en tokens par la tokenisation de la requête : un document qui contient "receptor"
+n'importe où est noté comme s'il contenait le mot-clé. Ici, un document qui contient la phrase
+exacte, ou tous ses termes dans une petite fenêtre, reçoit un bonus multiplicatif sur son score.
+
+Les positions sont celles des tokens prétraités (mots vides retirés, lemmatisés) : une phrase
+est tokenisée de la même façon que les documents. Les termes absents de l'index (les plus fréquents
+sont retirés par build_index) ne sont pas vérifiés, mais leur place dans la phrase est conservée.
+"""
+
+import heapq
+
+import numpy as np
+
+# Bonus par phrase : score * (1 + somme des bonus du document)
+PHRASE_BOOST = 0.5
+PROXIMITY_BOOST = 0.2
+# Écart toléré au-delà de la longueur de la phrase pour la proximité
+PROXIMITY_SLACK = 3
+
+
+def indexed_phrase(index, phrase):
+    """[(terme, décalage dans la phrase), ...] pour les termes de la phrase présents dans l'index."""
+    return [(term, offset) for offset, term in enumerate(phrase) if term in index]
+
+
+def candidate_docs(index, terms):
+    """Documents (identifiants triés) qui contiennent tous les termes, la liste la plus courte d'abord."""
+    postings = sorted((index.postings(term)[0] for term in terms), key=len)
+    docs = postings[0]
+    for doc_ids in postings[1:]:
+        docs = np.intersect1d(docs, doc_ids, assume_unique=True)
+    return docs
+
+
+def min_span(position_lists):
+    """Plus petite fenêtre (dernière - première position) contenant une occurrence de chaque liste."""
+    heap = [(positions[0], i, 0) for i, positions in enumerate(position_lists)]
+    heapq.heapify(heap)
+    highest = max(positions[0] for positions in position_lists)
+    best = highest - heap[0][0]
+    while True:
+        lowest, i, j = heapq.heappop(heap)
+        best = min(best, highest - lowest)
+        if j + 1 == len(position_lists[i]):
+            return best
+        following = position_lists[i][j + 1]
+        highest = max(highest, following)
+        heapq.heappush(heap, (following, i, j + 1))
+
+
+def phrase_matches(index, phrase, slack=PROXIMITY_SLACK):
+    """
+    Documents où la phrase (liste de tokens prétraités) apparaît : {doc_id: True si phrase exacte,
+    False si seulement tous ses termes indexés, dans n'importe quel ordre, dans une fenêtre de leur
+    étendue dans la phrase + slack positions}.
+    Phrases de moins de deux termes indexés : {} (rien à vérifier au-delà du sac de mots).
+    """
+    terms = indexed_phrase(index, phrase)
+    if len(terms) < 2:
+        return {}
+    docs = candidate_docs(index, [term for term, _ in terms])
+    if not len(docs):
+        return {}
+    # Positions de chaque terme, décodées une fois pour tous les candidats
+    positions = [index.positions(term, docs) for term, _ in terms]
+    width = terms[-1][1] - terms[0][1] + slack
+
+    matches = {}
+    for k, doc in enumerate(docs.tolist()):
+        doc_positions = [term_positions[k] for term_positions in positions]
+        # Phrase exacte : une même position de départ pour tous les termes (position - décalage)
+        starts = doc_positions[0] - terms[0][1]
+        for (_, offset), term_positions in zip(terms[1:], doc_positions[1:]):
+            starts = np.intersect1d(starts, term_positions - offset, assume_unique=True)
+        if len(starts):
+            matches[doc] = True
+        elif min_span([p.tolist() for p in doc_positions]) <= width:
+            matches[doc] = False
+    return matches
+
+
+def phrase_boosts(index, phrases, exact=PHRASE_BOOST, proximity=PROXIMITY_BOOST, slack=PROXIMITY_SLACK):
+    """
+    Bonus de chaque document pour une liste de phrases : {doc_id: somme des bonus}.
+    Vide si l'index n'a pas de positions (les classements restent alors inchangés).
+    """
+    boosts = {}
+    if not getattr(index, "has_positions", False):
+        return boosts
+    for phrase in phrases:
+        for doc, is_exact in phrase_matches(index, phrase, slack).items():
+            boosts[doc] = boosts.get(doc, 0.0) + (exact if is_exact else proximity)
+    return boosts
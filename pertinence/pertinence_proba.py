@@ -1,26 +1,19 @@
+import os
 import sys
-import json
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from indexation.compact_index import load_index, INDEX_PATH
+from pertinence.pertinence_vectorielle import requetes_patient
+from pertinence.pertinence_phrase import phrase_boosts
+from pertinence.query_cache import get_query_cache, query_key
 
 # --- BM25 functions ---
-from collections import defaultdict
+from collections import Counter
+import heapq
 
-import re
-import string
+import numpy as np
 
-def simple_tokenize(text):
-    # Enlève la ponctuation et met en minuscules
-    text = text.lower()
-    text = re.sub(f"[{re.escape(string.punctuation)}]", " ", text)
-    return text.split()
-
-def tokenize_and_clean(text):
-    # Enlève les mots vides manuellement (sans NLTK)
-    stopwords = {"and", "or", "the", "of", "a", "in", "on", "to", "for", "is", "with", "by"}
-    return [word for word in simple_tokenize(text) if word and word not in stopwords]
-
-def lemmatization(tokens):
-    # Pas de lemmatization réelle ici pour rester simple
-    return tokens  # Optionnel : ajoute un stemming très simple si besoin
+# Prétraitement commun avec l'indexation : les termes d'une requête sont ceux de l'index
+from indexation.preprocessing import preprocess
 
  #Extraction automatique des mots-clés pertinents à partir de la sortie textuelle du script treatment_recommender.py
 def extract_query_terms_from_output(output_text):
@@ -40,79 +33,178 @@ def extract_query_terms_from_output(output_text):
                 in_keywords = False
             else:
                 keywords.extend([kw.strip().lower() for kw in line.split(',') if kw.strip()])
-    text = " ".join(keywords)
-    tokens = tokenize_and_clean(text)
-    return lemmatization(tokens)
-
-def bm25_score(query_tokens, doc_tf, doc_len, avg_doc_len, idf, k=1.5, b=0.75):
-    score = 0.0
-    for term in query_tokens:
-        if term not in idf or term not in doc_tf:
-            continue
-        tf = doc_tf[term]
-        numerator = tf * (k + 1)
-        denominator = tf + k * (1 - b + b * (doc_len / avg_doc_len))
-        score += idf[term] * (numerator / denominator)
-    return score
-
-def rank_documents_bm25(query_tokens, documents, enriched_index):
+    return preprocess(" ".join(keywords))
+
+
+class BM25:
     """
-    query_tokens : liste de tokens de la requête
-    documents : liste de (nom_doc, liste_tokens)
-    enriched_index : {terme: {doc_name: (tf, idf), ...}, ...}
+    Modèle BM25 sur l'index compact. Les longueurs réelles des documents et la longueur moyenne
+    sont calculées à l'indexation (doc_lengths.npy, stats.json) ; l'idf BM25 vient de la taille
+    des listes de postings. Une requête est notée terme par terme : seuls les documents contenant
+    au moins un terme de la requête sont notés, dans un accumulateur de scores.
+    top_k évite de noter tout le corpus grâce aux bornes supérieures par terme (term_bounds.npy).
     """
-    N = len(documents)
-    avg_doc_len = sum(len(tokens) for _, tokens in documents) / N
-
-    doc_scores = []
 
-    for doc_name, tokens in documents:
-        score = 0.0
-        doc_len = len(tokens)
-        for term in query_tokens:
-            if term not in enriched_index:
+    def __init__(self, index, k1=1.5, b=0.75):
+        self.index = index
+        self.doc_names = index.doc_names
+        self.term_ids = index.term_ids
+        self.offsets = np.asarray(index.offsets)
+        self.doc_ids = index.doc_ids()
+        self.tfs = np.asarray(index.tfs, dtype=np.float64)
+        self.doc_lengths = np.asarray(index.doc_lengths, dtype=np.float64)
+        self.avg_doc_len = index.avg_doc_len
+        self.term_bounds = np.asarray(index.term_bounds, dtype=np.float64)
+        df = np.diff(self.offsets)
+        n = index.corpus_size
+        self.idf = np.log(1 + (n - df + 0.5) / (df + 0.5))
+        self.set_params(k1, b)
+
+    def set_params(self, k1=1.5, b=0.75):
+        # Normalisation par la longueur, calculée une fois par document pour (k1, b)
+        self.k1, self.b = k1, b
+        self.length_norm = k1 * (1 - b + b * self.doc_lengths / self.avg_doc_len)
+        # Borne supérieure du score de chaque terme : le score croît avec tf et décroît avec la longueur
+        max_tf, min_len = self.term_bounds[:, 0], self.term_bounds[:, 1]
+        self.upper = self.idf * max_tf * (k1 + 1) / (max_tf + k1 * (1 - b + b * min_len / self.avg_doc_len))
+
+    def _partial(self, i, query_tf, docs, tfs):
+        return query_tf * self.idf[i] * tfs * (self.k1 + 1) / (tfs + self.length_norm[docs])
+
+    def scores(self, query_tokens):
+        """(doc_ids, scores) des seuls documents contenant au moins un terme de la requête."""
+        postings, partials = [], []
+        for term, query_tf in Counter(query_tokens).items():
+            if term not in self.term_ids:
                 continue
-            if doc_name not in enriched_index[term]:
+            i = self.term_ids[term]
+            start, end = self.offsets[i], self.offsets[i + 1]
+            docs, tfs = self.doc_ids[start:end], self.tfs[start:end]
+            postings.append(docs)
+            partials.append(self._partial(i, query_tf, docs, tfs))
+        if not postings:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        # Accumulateur creux : une case par document rencontré, pas par document du corpus
+        doc_ids, slots = np.unique(np.concatenate(postings), return_inverse=True)
+        return doc_ids, np.bincount(slots, weights=np.concatenate(partials), minlength=len(doc_ids))
+
+    def scores_for(self, query_tokens, doc_ids):
+        """Scores des seuls documents doc_ids (triés), par recherche dichotomique dans les postings de la requête."""
+        doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        scores = np.zeros(len(doc_ids))
+        for term, query_tf in Counter(query_tokens).items():
+            if term not in self.term_ids or not len(doc_ids):
                 continue
-            tf, idf = enriched_index[term][doc_name]
-            numerator = tf * (1.5 + 1)
-            denominator = tf + 1.5 * (1 - 0.75 + 0.75 * doc_len / avg_doc_len)
-            partial_score = idf * (numerator / denominator)
-            #print(f"Doc: {doc_name}, Term: '{term}' → tf: {tf}, idf: {idf:.3f}, score: {partial_score:.4f}")
-            score += partial_score
-
-        doc_scores.append((doc_name, score))
-
-
-    return sorted(doc_scores, key=lambda x: x[1], reverse=True)
-
-def rank_boolean_results(query_terms, matching_docs, index):
-    scores = []
-    for doc in matching_docs:
-        score = sum(1 for term in query_terms if doc in index.get(term, {}))
-        scores.append((doc, score))
-    return sorted(scores, key=lambda x: x[1], reverse=True)
+            i = self.term_ids[term]
+            start, end = self.offsets[i], self.offsets[i + 1]
+            docs = self.doc_ids[start:end]
+            pos = np.minimum(np.searchsorted(docs, doc_ids), len(docs) - 1)
+            hit = docs[pos] == doc_ids
+            scores[hit] += self._partial(i, query_tf, doc_ids[hit], self.tfs[start + pos[hit]])
+        return scores
+
+    def top_k(self, query_tokens, k):
+        """
+        Les k meilleurs documents (doc_ids, scores), triés, par MaxScore. Les termes sont pris par borne
+        supérieure décroissante ; tant que la somme des bornes des termes restants peut atteindre le k-ième
+        meilleur score, le terme est essentiel et tous ses documents sont notés. Ensuite, les termes restants
+        ne font que compléter les candidats (recherche dichotomique dans leurs postings), et les candidats
+        qui ne peuvent plus atteindre le k-ième score sont écartés.
+        """
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        terms = [(self.term_ids[t], qtf) for t, qtf in Counter(query_tokens).items() if t in self.term_ids]
+        terms.sort(key=lambda term: -term[1] * self.upper[term[0]])
+        bounds = np.array([qtf * self.upper[i] for i, qtf in terms])
+        # remaining[j] : score maximal qu'un document peut encore gagner avec les termes j, j+1, ...
+        remaining = np.append(np.cumsum(bounds[::-1])[::-1], 0.0)
+
+        cand_docs, cand_scores = np.zeros(0, dtype=np.int64), np.zeros(0)
+        threshold = -np.inf
+        for j, (i, qtf) in enumerate(terms):
+            start, end = self.offsets[i], self.offsets[i + 1]
+            docs = self.doc_ids[start:end]
+            if remaining[j] >= threshold:
+                # Terme essentiel : un document pas encore vu peut encore entrer dans le top-k
+                partial = self._partial(i, qtf, docs, self.tfs[start:end])
+                cand_docs, slots = np.unique(np.concatenate((cand_docs, docs)), return_inverse=True)
+                cand_scores = np.bincount(slots, weights=np.concatenate((cand_scores, partial)), minlength=len(cand_docs))
+            elif len(cand_docs):
+                # Terme non essentiel : seuls les candidats présents dans ses postings sont complétés
+                pos = np.minimum(np.searchsorted(docs, cand_docs), len(docs) - 1)
+                hit = docs[pos] == cand_docs
+                cand_scores[hit] += self._partial(i, qtf, cand_docs[hit], self.tfs[start + pos[hit]])
+            if len(cand_docs) >= k:
+                threshold = np.partition(cand_scores, len(cand_scores) - k)[len(cand_scores) - k]
+                keep = cand_scores + remaining[j + 1] >= threshold - 1e-9
+                cand_docs, cand_scores = cand_docs[keep], cand_scores[keep]
+
+        # Tas borné aux k meilleurs (égalités : ordre de la table des documents)
+        best = heapq.nlargest(k, zip(np.round(cand_scores, 12).tolist(), (-cand_docs).tolist(), cand_scores.tolist()))
+        return (np.array([-doc for _, doc, _ in best], dtype=np.int64),
+                np.array([score for _, _, score in best], dtype=np.float64))
+
+
+def rank_documents_bm25(query_tokens, bm25, top_k=None, boosts=None):
+    """
+    query_tokens : liste de tokens de la requête
+    bm25 : modèle BM25 construit sur l'index (cf. BM25)
+    top_k : ne garder que les top_k meilleurs documents (évaluation avec élagage, cf. BM25.top_k)
+    boosts : {doc_id: bonus} de phrase et de proximité (cf. pertinence_phrase.py), score * (1 + bonus)
+    Retourne [(nom_doc, score), ...] trié par score décroissant (documents sans terme de la requête exclus).
+    """
+    if top_k is not None and not boosts:
+        doc_ids, scores = bm25.top_k(query_tokens, top_k)
+        return [(bm25.doc_names[d], float(score)) for d, score in zip(doc_ids, scores)]
+    if top_k is not None:
+        # Un bonus ne fait que monter un score : le top-k final est parmi le top-k sans bonus et les documents bonifiés
+        doc_ids = np.union1d(bm25.top_k(query_tokens, top_k)[0], np.fromiter(boosts.keys(), dtype=np.int64))
+        scores = bm25.scores_for(query_tokens, doc_ids)
+        doc_ids, scores = doc_ids[scores > 0], scores[scores > 0]
+    else:
+        doc_ids, scores = bm25.scores(query_tokens)
+    if boosts:
+        scores = scores * (1 + np.array([boosts.get(d, 0.0) for d in doc_ids.tolist()]))
+    # Égalités : ordre de la table des documents, comme pour le modèle vectoriel
+    order = np.lexsort((doc_ids, -np.round(scores, 12)))[:top_k]
+    return [(bm25.doc_names[doc_ids[i]], float(scores[i])) for i in order]
+
+
+def doc_pertinents_bm25(filename, bm25=None, top_k=None):
+    """Même sortie que doc_pertinents_vectoriel, avec le classement BM25 (requêtes déjà classées servies par le cache)."""
+    requetes = requetes_patient(filename)
+    if requetes and bm25 is None:
+        bm25 = BM25(load_index(INDEX_PATH))
+    cache = get_query_cache()
+    all_results = []
+    for treatment, node_path, query_tokens, phrases, _ in requetes:
+        results = cache.get_or_compute(
+            query_key("bm25", query_tokens, phrases, top_k, k1=bm25.k1, b=bm25.b), bm25.index.version,
+            lambda: rank_documents_bm25(query_tokens, bm25, top_k, phrase_boosts(bm25.index, phrases)))
+        all_results.append({"treatment": treatment, "node_path": node_path, "results": results})
+    return all_results
 
 
 # --- Evidence Curator ---
-def evidence_curator(query_tokens, documents, enriched_index, top_k=15):
+def evidence_curator(query_tokens, bm25, top_k=15):
     """
     Classe les documents par pertinence et sélectionne les top_k documents.
     """
-    ranked = rank_documents_bm25(query_tokens, documents, enriched_index)
-    return ranked[:top_k]
+    return rank_documents_bm25(query_tokens, bm25, top_k)
 
 
 if __name__ == "__main__":
-    with open("index.json", "r") as f:
-        enriched_index = json.load(f)
-
-    # Construire les documents
-    doc_tokens = {}
-    for term, doc_data in enriched_index.items():
-        for doc_name in doc_data:
-            doc_tokens.setdefault(doc_name, []).append(term)
-
-    documents = [(doc, tokens) for doc, tokens in doc_tokens.items()]
-
-    
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Classement BM25 des documents pour un fichier de recommandations")
+    parser.add_argument("recommendations", nargs="?", default="../recommendations/recommendations_MBC_005.json")
+    parser.add_argument("--k1", type=float, default=1.5)
+    parser.add_argument("--b", type=float, default=0.75)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    bm25 = BM25(load_index(INDEX_PATH), k1=args.k1, b=args.b)
+    for reco in doc_pertinents_bm25(args.recommendations, bm25, top_k=args.top):
+        print(f"\nTraitement proposé : {reco['treatment']}")
+        print(f"Chemin de décision : {reco['node_path']}")
+        for doc, score in reco["results"]:
+            print(f"{doc} → Score : {score:.4f}")
@@ -26,116 +26,95 @@ Forme de results où on sépare les traitements
 
 
 
-import re
-import math
+import os
+import sys
 import json
-from retour_doc import extract_abstract_preview, extract_first_date, extract_first_author
-
-import nltk
-from nltk import pos_tag
-from nltk.tokenize import word_tokenize
-from nltk.corpus import stopwords
-from nltk.stem import WordNetLemmatizer
-from nltk.corpus import wordnet, stopwords
-import string
-#problèmes : patient 3 (aucune correspondance pour les mots clefs) et patient 4 : pas de mots clefs donc ne sait pas gérer ce cas
-
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from indexation.compact_index import load_index, INDEX_PATH
+from pertinence.pertinence_phrase import phrase_boosts
+from pertinence.query_cache import get_query_cache, query_key
+# Prétraitement commun avec l'indexation : les tokens d'une requête sont ceux de l'index
+from indexation.preprocessing import preprocess
 
-def cosine_similarity(vec1, vec2):
-    # Produit scalaire
-    dot_product = sum(a * b for a, b in zip(vec1, vec2))
-    
-    # Normes des vecteurs
-    norm1 = math.sqrt(sum(a * a for a in vec1))
-    norm2 = math.sqrt(sum(b * b for b in vec2))
-    
+from collections import Counter
 
-    if norm1 == 0 or norm2 == 0:
-        return 0.0
-    
-    return dot_product / (norm1 * norm2)
+import numpy as np
+#problèmes : patient 3 (aucune correspondance pour les mots clefs) et patient 4 : pas de mots clefs donc ne sait pas gérer ce cas
 
 
 # --- Recherche vectorielle avec similarité cosinus ---
 
-def tfidf_vector(term_list, doc_tokens, enriched_index, doc_name=None, is_query=False):
-    """Construit un vecteur TF-IDF pour un document ou une requête."""
-    vector = []
-    for term in term_list:
-        tf_idf = 0
-        if term in enriched_index:
-            if is_query:
-                tf = doc_tokens.count(term)
-            else:
-                tf = enriched_index[term].get(doc_name, (0, 0))[0] if doc_name else 0
-            idf_values = []
-            for val in enriched_index[term].values():
-                if isinstance(val, (list, tuple)) and len(val) == 2:
-                    tf_, idf = val
-                    if isinstance(idf, (float, int)):
-                        idf_values.append(idf)
-            
-            idf = sum(idf_values) / len(idf_values) if idf_values else 0
-            tf_idf = tf * idf
-            
-        vector.append(tf_idf)
-        
-    return vector
-
-
-def rank_documents_vectoriel(query_tokens, documents, enriched_index):
-    """Classe les documents en fonction de la similarité cosinus entre la requête et chaque document."""
-    all_terms = list(set(enriched_index.keys()) & set(query_tokens))
-    query_vec = tfidf_vector(all_terms, query_tokens, enriched_index, is_query=True)
-    
-
-    doc_scores = []
-    for doc_name, tokens in documents:
-        doc_vec = tfidf_vector(all_terms, tokens, enriched_index, doc_name=doc_name)
-        if not any(doc_vec):
-            pass
-        score = cosine_similarity(query_vec, doc_vec)
-        doc_scores.append((doc_name, score))
-        
-
-    return sorted(doc_scores, key=lambda x: x[1], reverse=True)
-
-
-def construire_vecteurs_documents(index):
+class TfidfMatrix:
     """
-    Construit des vecteurs TF-IDF pour tous les documents à partir d'un index inversé enrichi.
-    Retourne un dictionnaire : {doc_name: [vecteur tf-idf aligné avec les termes de l'index]}
+    Matrice creuse CSR termes x documents des poids tf * idf, construite une seule fois
+    à partir de l'index compact. Une requête est notée contre tous les documents
+    par un produit vecteur-matrice creux sur les seules lignes des termes de la requête.
     """
-    termes = list(index.keys())
-    vecteurs = {}
-
-    for terme in termes:
-        for doc, value in index[terme].items():
-            if doc not in vecteurs:
-                vecteurs[doc] = [0.0] * len(termes)
-            try:
-                if isinstance(value, (list, tuple)) and len(value) == 2:
-                    tf, idf = value
-                    vecteurs[doc][termes.index(terme)] = tf * idf
-                else:
-                    vecteurs[doc][termes.index(terme)] = float(value)
-            except Exception:
-                pass
-
-    return termes, vecteurs
-
-#tokenization de la requête : idem que pour la tokenization des docs
 
-from nltk.tokenize import word_tokenize
-from nltk.corpus import stopwords
+    def __init__(self, index):
+        from scipy.sparse import csr_matrix  # importé à la construction de la matrice seulement
+        self.index = index
+        self.doc_names = index.doc_names
+        self.term_ids = index.term_ids
+        self.idf = np.asarray(index.idf, dtype=np.float64)
+        offsets = np.asarray(index.offsets)
+        term_of_posting = np.repeat(np.arange(len(index.terms)), np.diff(offsets))
+        weights = np.asarray(index.tfs, dtype=np.float64) * self.idf[term_of_posting]
+        shape = (len(index.terms), index.n_docs)
+        self.weights = csr_matrix((weights, (term_of_posting, index.doc_ids())), shape=shape)
+        # Carrés des poids (alignés sur weights.data) : la norme d'un document est calculée sur les termes de la requête,
+        # comme le faisait l'ancienne version (vecteurs restreints aux termes communs)
+        self.squared = self.weights.data ** 2
+
+    def scores(self, query_tokens):
+        """Similarité cosinus entre la requête et chaque document (tableau aligné sur doc_names)."""
+        counts = Counter(t for t in query_tokens if t in self.term_ids)
+        if not counts:
+            return np.zeros(len(self.doc_names))
+        ids = np.fromiter((self.term_ids[t] for t in counts), dtype=np.int64, count=len(counts))
+        query_vec = np.fromiter(counts.values(), dtype=np.float64, count=len(counts)) * self.idf[ids]
+
+        # Produit creux sur les lignes de la requête : on rassemble leurs postings (indptr CSR)
+        starts, ends = self.weights.indptr[ids], self.weights.indptr[ids + 1]
+        rows = np.concatenate([np.arange(a, b) for a, b in zip(starts, ends)])
+        docs = self.weights.indices[rows]
+        n_docs = len(self.doc_names)
+        dot = np.bincount(docs, weights=self.weights.data[rows] * np.repeat(query_vec, ends - starts), minlength=n_docs)
+        doc_norms = np.sqrt(np.bincount(docs, weights=self.squared[rows], minlength=n_docs))
+        query_norm = np.sqrt(query_vec @ query_vec)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scores = np.where(doc_norms > 0, dot / (doc_norms * query_norm), 0.0)
+        return scores if query_norm > 0 else np.zeros(len(self.doc_names))
+
+
+def rank_documents_vectoriel(query_tokens, tfidf, top_k=None, boosts=None):
+    """
+    Classe les documents en fonction de la similarité cosinus entre la requête et chaque document.
+    top_k : ne trier que les top_k meilleurs (sélection par argpartition, sans tri complet du corpus)
+    boosts : {doc_id: bonus} de phrase et de proximité (cf. pertinence_phrase.py), score * (1 + bonus)
+    """
+    scores = tfidf.scores(query_tokens)
+    if boosts:
+        ids = np.fromiter(boosts.keys(), dtype=np.int64, count=len(boosts))
+        scores[ids] *= 1 + np.fromiter(boosts.values(), dtype=np.float64, count=len(boosts))
+    # Arrondi de la clé de tri : les égalités exactes (à l'erreur d'arrondi près) gardent l'ordre des documents
+    keys = -np.round(scores, 12)
+    if top_k is not None and top_k < len(keys):
+        if top_k <= 0:
+            return []
+        # Tous les documents au moins aussi bons que le k-ième (égalités comprises), puis tri de ceux-là seulement
+        kth = keys[np.argpartition(keys, top_k - 1)[top_k - 1]]
+        candidates = np.flatnonzero(keys <= kth)
+        order = candidates[np.argsort(keys[candidates], kind="stable")][:top_k]
+    else:
+        order = np.argsort(keys, kind="stable")
+    return [(tfidf.doc_names[i], float(scores[i])) for i in order]
+
+
+#tokenization de la requête : idem que pour la tokenization des docs (cf. indexation/preprocessing.py)
 
 def preprocess_query(text):
-    tokens = word_tokenize(text)
-    tokens = [t.lower() for t in tokens]
-    tokens = [t for t in tokens if t.isalnum()]
-    tokens = [t for t in tokens if t not in stopwords.words('english')]
-    tokens = lemmatization(tokens)
-    return tokens
+    return preprocess(text)
 
 
 # Extraction automatique des mots-clés pertinents à partir de la sortie textuelle du script treatment_recommender.py
@@ -162,42 +141,12 @@ def extract_query_terms_from_output(output_text):
 
 
 
-
-def tokenize_and_clean(tokenized_text):
-    tokenized_text=[t.lower() for t in tokenized_text]
-    stop_words = set(stopwords.words('english'))
-    tokens = [
-        t for t in tokenized_text
-        if t.isalnum() and t not in stop_words
-    ]
-    return tokens
-
-
-def lemmatization(text):
-    lemmatizer = WordNetLemmatizer()
-
-    # Fonction utilitaire pour convertir POS vers WordNet
-    def get_wordnet_pos(treebank_tag):
-        if treebank_tag.startswith('J'):
-            return wordnet.ADJ
-        elif treebank_tag.startswith('V'):
-            return wordnet.VERB
-        elif treebank_tag.startswith('N'):
-            return wordnet.NOUN
-        elif treebank_tag.startswith('R'):
-            return wordnet.ADV
-        else:
-            return wordnet.NOUN  # défaut
-
-    
-    tagged = pos_tag(text)      
-    return [lemmatizer.lemmatize(word, get_wordnet_pos(pos)) for word, pos in tagged]
+def tokens_request(request):
+    # Même prétraitement que les documents, ordre des tokens conservé (positions des phrases)
+    return preprocess(request)
 
 def tokenized_request(request):
-    # Appeler word_tokenize(request) avant tokenize_and_clean
-    word_tokenize(request)
-    tokens = word_tokenize(request)
-    request = lemmatization(tokenize_and_clean(tokens))
+    request = tokens_request(request)
     index = {}
     for term in request:
         if term not in index:
@@ -209,37 +158,27 @@ def tokenized_request(request):
 
 
 
-# --- Fonction pour trouver les documents pertinents à partir d'un fichier patient ---
-def doc_pertinents_vectoriel(filename):
-    with open("../indexation/index.json", "r", encoding="utf-8") as f:
-        enriched_index = json.load(f)
-        for term in enriched_index:
-            for doc in enriched_index[term]:
-                entry = enriched_index[term][doc]
-                if isinstance(entry, list) and len(entry) == 2:
-                    enriched_index[term][doc] = tuple(entry)
-
-    doc_tokens = {}
-    for term, doc_infos in enriched_index.items():
-        for doc, (tf, _) in doc_infos.items():
-            if tf > 0:
-                doc_tokens.setdefault(doc, []).extend([term] * tf)
-
-    documents = [(doc, tokens) for doc, tokens in doc_tokens.items()]
-
-    try:
-        with open(filename, "r") as f:
-            patient_data = json.load(f)
-    except FileNotFoundError:
-        print(f"Fichier patient non trouvé : {filename}")
-        return []
+# --- Requêtes construites à partir d'un fichier patient (une par recommandation) ---
+# filename : chemin du fichier de recommandations, ou le dictionnaire déjà en mémoire
+# Retourne [(traitement, node_path nettoyé, tokens de la requête, phrases, texte de la requête), ...]
+# phrases : mots-clés de plusieurs tokens (ex. "sacituzumab govitecan"), chacun sous forme de liste de tokens
+# texte de la requête : texte brut avant tokenisation (requête des modèles d'embeddings)
+def requetes_patient(filename):
+    if isinstance(filename, dict):
+        patient_data = filename
+    else:
+        try:
+            with open(filename, "r") as f:
+                patient_data = json.load(f)
+        except FileNotFoundError:
+            print(f"Fichier patient non trouvé : {filename}")
+            return []
 
     if not patient_data.get("recommendations"):
         print("Aucun traitement recommandé dans ce fichier patient.")
         return []
 
-    # Remplacement du traitement d'une seule recommandation par une boucle sur toutes les recommandations
-    all_results = []
+    requetes = []
     for reco in patient_data["recommendations"]:
         node_path_cleaned = reco.get("node_path", "")
         node_path_cleaned = node_path_cleaned.replace("‑", "-").replace("→", " ").replace(">", " ")
@@ -255,25 +194,53 @@ def doc_pertinents_vectoriel(filename):
         keywords_text = " ".join(fields)
 
         request_index = tokenized_request(keywords_text)
-        query_tokens = list(request_index.keys())
-        results = rank_documents_vectoriel(query_tokens, documents, enriched_index)
+        requetes.append((reco.get("treatment", ""), node_path_cleaned, list(request_index.keys()),
+                         phrases_request(reco.get("keywords", [])), keywords_text))
+    return requetes
+
+
+def phrases_request(keywords):
+    # Mots-clés qui restent des phrases après prétraitement (au moins deux tokens), sans doublon
+    phrases = dict.fromkeys(tuple(tokens_request(keyword)) for keyword in keywords)
+    return [list(phrase) for phrase in phrases if len(phrase) >= 2]
+
+
+# --- Fonction pour trouver les documents pertinents à partir d'un fichier patient ---
+# filename : chemin du fichier de recommandations, ou le dictionnaire déjà en mémoire
+def doc_pertinents_vectoriel(filename, tfidf=None, top_k=None):
+    # tfidf : matrice déjà construite (moteur de recherche persistant), sinon chargée depuis l'index
+    # top_k : nombre de documents gardés par recommandation (tous par défaut)
+    # Les requêtes déjà classées (même sous-type, même chemin de décision) sont servies par le cache
+    requetes = requetes_patient(filename)
+    if requetes and tfidf is None:
+        tfidf = TfidfMatrix(load_index(INDEX_PATH))
+    cache = get_query_cache()
+
+    # Remplacement du traitement d'une seule recommandation par une boucle sur toutes les recommandations
+    all_results = []
+    for treatment, node_path_cleaned, query_tokens, phrases, _ in requetes:
+        # Bonus de phrase et de proximité si l'index a été construit avec les positions
+        results = cache.get_or_compute(
+            query_key("vectoriel", query_tokens, phrases, top_k), tfidf.index.version,
+            lambda: rank_documents_vectoriel(query_tokens, tfidf, top_k, phrase_boosts(tfidf.index, phrases)))
 
         all_results.append({
-            "treatment": reco.get("treatment", ""),
+            "treatment": treatment,
             "node_path": node_path_cleaned,
             "results": results
         })
     return all_results
 
-# exemple d'appel de la fonction dans un autre script ou en fin de pertinence_vectorielle.py
-results = doc_pertinents_vectoriel("/Users/adele/Documents/CS/EI_ST4/carjac/recommendations/recommendations_MBC_005.json")
+if __name__ == "__main__":
+    # exemple d'appel de la fonction
+    results = doc_pertinents_vectoriel(sys.argv[1] if len(sys.argv) > 1 else "../recommendations/recommendations_MBC_005.json")
 
-# Afficher les résultats de manière lisible
-for reco in results:
-    print(f"\nTraitement proposé : {reco['treatment']}")
-    print(f"Chemin de décision : {reco['node_path']}")
-    for doc, score in reco["results"]:
-        print(f"{doc} → Score : {score:.4f}")
+    # Afficher les résultats de manière lisible
+    for reco in results:
+        print(f"\nTraitement proposé : {reco['treatment']}")
+        print(f"Chemin de décision : {reco['node_path']}")
+        for doc, score in reco["results"]:
+            print(f"{doc} → Score : {score:.4f}")
 
 
 
@@ -0,0 +1,165 @@
+"""
+Cache local des métadonnées PubMed (abstract, premier auteur, date de publication) indexé par PMID.
+Base SQLite pré-remplie à partir d'un export XML PubMed (PubmedArticleSet, éventuellement .gz)
+ou d'un serveur efetch (NCBI ou serveur local de remplacement) ; un accès en cache ne fait aucun appel réseau.
+
+Remplissage :
+    python pertinence/pubmed_cache.py --xml pubmed_dump.xml.gz
+    python pertinence/pubmed_cache.py --server http://localhost:8080/efetch.fcgi
+"""
+
+import os
+import re
+import sys
+import gzip
+import sqlite3
+import threading
+from xml.etree import ElementTree as ET
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(BASE_DIR))
+CACHE_PATH = os.path.join(BASE_DIR, "pubmed_metadata.sqlite3")
+
+NO_ABSTRACT = "Aucun abstract trouvé."
+NO_AUTHOR = "Auteur non trouvé."
+NO_DATE = "Aucune date trouvée."
+
+
+def pmid_from_filename(filename):
+    # PMID_12088202_Titre_du_document.pdf -> "12088202"
+    match = re.search(r"PMID_(\d+)", os.path.basename(filename))
+    return match.group(1) if match else None
+
+
+def parse_article(article):
+    """Retourne (pmid, {abstract, first_author, pub_date}) pour un élément <PubmedArticle>."""
+    pmid = article.findtext(".//PMID")
+    abstract_text = article.find(".//AbstractText")
+    abstract = abstract_text.text.strip() if abstract_text is not None and abstract_text.text else NO_ABSTRACT
+
+    first_author = NO_AUTHOR
+    author = article.find(".//AuthorList/Author")
+    if author is not None and author.find("LastName") is not None and author.find("ForeName") is not None:
+        first_author = f"{author.find('ForeName').text} {author.find('LastName').text} et al."
+
+    pub_date = NO_DATE
+    date_elem = article.find(".//PubDate")
+    if date_elem is not None:
+        year = date_elem.find("Year")
+        month = date_elem.find("Month")
+        if year is not None and month is not None:
+            pub_date = f"{month.text} {year.text}"
+        elif year is not None:
+            pub_date = year.text
+    return pmid, {"abstract": abstract, "first_author": first_author, "pub_date": pub_date}
+
+
+def parse_pubmed_xml(xml_text):
+    """Analyse une réponse efetch (plusieurs articles possibles) : {pmid: métadonnées}."""
+    root = ET.fromstring(xml_text)
+    records = {}
+    for article in root.iter("PubmedArticle"):
+        pmid, metadata = parse_article(article)
+        if pmid:
+            records[pmid] = metadata
+    return records
+
+
+class PubmedCache:
+    """Base SQLite {pmid: (abstract, first_author, pub_date)} partagée entre les threads du serveur."""
+
+    def __init__(self, db_path=CACHE_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS metadata ("
+            "pmid TEXT PRIMARY KEY, abstract TEXT, first_author TEXT, pub_date TEXT)"
+        )
+        self._conn.commit()
+
+    def get_many(self, pmids):
+        """Une seule requête pour tous les PMID : {pmid: métadonnées} pour ceux présents en cache."""
+        pmids = [p for p in set(pmids) if p]
+        if not pmids:
+            return {}
+        placeholders = ",".join("?" * len(pmids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT pmid, abstract, first_author, pub_date FROM metadata WHERE pmid IN ({placeholders})",
+                pmids,
+            ).fetchall()
+        return {pmid: {"abstract": abstract, "first_author": author, "pub_date": date}
+                for pmid, abstract, author, date in rows}
+
+    def put_many(self, records):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO metadata (pmid, abstract, first_author, pub_date) VALUES (?, ?, ?, ?)",
+                [(pmid, m["abstract"], m["first_author"], m["pub_date"]) for pmid, m in records.items()],
+            )
+            self._conn.commit()
+
+    def populate_from_xml(self, xml_path, batch_size=1000):
+        """Importe un export XML PubMed (lecture en flux, compatible avec les gros fichiers .xml.gz)."""
+        opener = gzip.open if xml_path.endswith(".gz") else open
+        count = 0
+        batch = {}
+        with opener(xml_path, "rb") as f:
+            for _, elem in ET.iterparse(f, events=("end",)):
+                if elem.tag != "PubmedArticle":
+                    continue
+                pmid, metadata = parse_article(elem)
+                if pmid:
+                    batch[pmid] = metadata
+                elem.clear()
+                if len(batch) >= batch_size:
+                    self.put_many(batch)
+                    count += len(batch)
+                    batch = {}
+        self.put_many(batch)
+        return count + len(batch)
+
+    def populate_from_server(self, pmids, base_url, batch_size=200):
+        """Remplit le cache depuis un serveur efetch (NCBI ou serveur local de remplacement)."""
+        from pertinence.pubmed_client import EfetchClient
+        client = EfetchClient(base_url, batch_size=batch_size)
+        try:
+            records = client.fetch(pmids)
+        finally:
+            client.close()
+        self.put_many(records)
+        return len(records)
+
+    def close(self):
+        self._conn.close()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Cache partagé du processus."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = PubmedCache()
+    return _cache
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Remplissage du cache local des métadonnées PubMed")
+    parser.add_argument("--xml", help="export XML PubMed (PubmedArticleSet, .xml ou .xml.gz)")
+    parser.add_argument("--server", help="URL efetch à interroger pour les PMID du corpus")
+    parser.add_argument("--corpus", default=os.path.join(BASE_DIR, "..", "pubmed_articles"))
+    args = parser.parse_args()
+
+    cache = PubmedCache()
+    if args.xml:
+        print(f"{cache.populate_from_xml(args.xml)} articles importés depuis {args.xml}")
+    if args.server:
+        pmids = [pmid_from_filename(f) for f in os.listdir(args.corpus) if f.endswith(".pdf")]
+        print(f"{cache.populate_from_server([p for p in pmids if p], args.server)} articles importés depuis {args.server}")
@@ -0,0 +1,152 @@
+"""
+Client efetch PubMed pour les PMID absents du cache local (pubmed_cache.py).
+Une seule session HTTP keep-alive partagée, plusieurs PMID par requête (ids séparés par des virgules),
+XML analysé une seule fois pour les trois champs, limitation de débit et nouvelles tentatives
+avec attente exponentielle, le tout borné par une échéance optionnelle (deadline, time.monotonic()).
+base_url permet de viser un serveur local de remplacement (tests, hors ligne).
+
+Échecs mémorisés, pour ne pas refaire à chaque affichage les mêmes requêtes vouées à l'échec :
+    - un PMID absent de la réponse efetch n'est plus demandé pendant NOT_FOUND_TTL secondes ;
+    - après un échec de connexion (tentatives épuisées), fetch échoue aussitôt (requests.ConnectionError)
+      pendant OFFLINE_TTL secondes, sans appel réseau.
+"""
+
+import os
+import sys
+import time
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from pertinence.pubmed_cache import parse_pubmed_xml, pmid_from_filename
+
+EFETCH_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi"
+
+# Codes HTTP pour lesquels on retente (limitation de débit NCBI, erreurs serveur)
+RETRY_STATUS = {429, 500, 502, 503, 504}
+NOT_FOUND_TTL = 3600
+OFFLINE_TTL = 60
+MAX_NOT_FOUND = 100000  # au-delà, les PMID expirés sont oubliés
+
+
+class EfetchClient:
+
+    def __init__(self, base_url=EFETCH_URL, batch_size=200, requests_per_second=3.0,
+                 max_retries=3, backoff=0.5, timeout=10, api_key=None, pool_size=4,
+                 not_found_ttl=NOT_FOUND_TTL, offline_ttl=OFFLINE_TTL):
+        self.base_url = base_url
+        self.batch_size = batch_size
+        self.min_interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.api_key = api_key
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._rate_lock = threading.Lock()
+        self._last_request = 0.0
+        self.not_found_ttl = not_found_ttl
+        self.offline_ttl = offline_ttl
+        self._failures_lock = threading.Lock()
+        self._not_found = {}  # pmid -> fin de la période sans nouvelle demande (time.monotonic())
+        self._offline_until = 0.0
+
+    def _wait_rate_limit(self):
+        # NCBI autorise 3 requêtes/s sans clé API (10 avec)
+        with self._rate_lock:
+            delay = self._last_request + self.min_interval - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self._last_request = time.monotonic()
+
+    def _remaining(self, deadline):
+        # Délai d'une tentative : timeout, réduit au temps restant avant l'échéance
+        if deadline is None:
+            return self.timeout
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise requests.Timeout("Échéance dépassée avant la requête efetch")
+        return min(self.timeout, remaining)
+
+    def _get(self, pmids, deadline=None):
+        params = {"db": "pubmed", "id": ",".join(pmids), "retmode": "xml"}
+        if self.api_key:
+            params["api_key"] = self.api_key
+        unreachable = False  # dernière tentative sans réponse du serveur
+        for attempt in range(self.max_retries + 1):
+            self._remaining(deadline)
+            self._wait_rate_limit()
+            try:
+                response = self.session.get(self.base_url, params=params, timeout=self._remaining(deadline))
+                unreachable = False
+                if response.status_code not in RETRY_STATUS:
+                    response.raise_for_status()
+                    return response.text
+            except (requests.ConnectionError, requests.Timeout):
+                unreachable = True
+                if attempt == self.max_retries:
+                    self._mark_offline()
+                    raise
+            if attempt < self.max_retries:
+                delay = self.backoff * 2 ** attempt
+                if deadline is not None and time.monotonic() + delay >= deadline:
+                    if unreachable:
+                        self._mark_offline()
+                    raise requests.Timeout("Échéance dépassée pendant les nouvelles tentatives efetch")
+                time.sleep(delay)
+        response.raise_for_status()
+
+    def _mark_offline(self):
+        with self._failures_lock:
+            self._offline_until = time.monotonic() + self.offline_ttl
+
+    def fetch(self, pmids, deadline=None):
+        """
+        {pmid: {abstract, first_author, pub_date}} pour les PMID trouvés, par lots de batch_size.
+        deadline : échéance (time.monotonic()) ; requests.Timeout si elle est atteinte avant la fin.
+        """
+        now = time.monotonic()
+        with self._failures_lock:
+            pmids = [p for p in dict.fromkeys(pmids) if p and self._not_found.get(p, 0.0) <= now]
+            offline = self._offline_until > now
+        if not pmids:
+            return {}
+        if offline:
+            raise requests.ConnectionError("PubMed injoignable récemment : pas de nouvel appel efetch pour l'instant")
+        records = {}
+        for i in range(0, len(pmids), self.batch_size):
+            batch = pmids[i:i + self.batch_size]
+            found = parse_pubmed_xml(self._get(batch, deadline))
+            records.update(found)
+            # PMID inconnus de PubMed : inutile de les redemander à chaque affichage
+            expiry = time.monotonic() + self.not_found_ttl
+            with self._failures_lock:
+                if len(self._not_found) > MAX_NOT_FOUND:
+                    self._not_found = {p: t for p, t in self._not_found.items() if t > now}
+                self._not_found.update((p, expiry) for p in batch if p not in found)
+        return records
+
+    def fetch_files(self, filenames, deadline=None):
+        """Comme fetch, à partir de noms de fichiers PMID_<id>_<titre>.pdf."""
+        return self.fetch((pmid_from_filename(name) for name in filenames), deadline)
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Client partagé du processus (une seule session keep-alive)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = EfetchClient()
+    return _client
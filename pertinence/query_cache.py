@@ -0,0 +1,99 @@
+"""
+Cache des classements de documents, partagé par le processus.
+
+Des patients de même sous-type et de même chemin de décision produisent la même requête :
+le classement est alors servi depuis la mémoire au lieu de re-noter tout le corpus.
+La clé est canonique (multiensemble des tokens, phrases triées, modèle et paramètres), ainsi
+l'ordre des mots-clés n'a pas d'importance. Chaque entrée est rattachée à la version de l'index
+(CompactIndex.version) : dès qu'une requête arrive avec un index reconstruit, tout le cache est vidé.
+Taille bornée (éviction LRU) et durée de vie limitée (TTL) ; compteurs hits / misses dans stats().
+"""
+
+import time
+import threading
+from collections import Counter, OrderedDict
+
+MAX_ENTRIES = 1024
+TTL = 3600  # secondes
+
+
+def query_key(model, query_tokens, phrases=(), top_k=None, **params):
+    """Clé canonique d'une requête : ne dépend pas de l'ordre des tokens ni de celui des phrases."""
+    return (model,
+            tuple(sorted(Counter(query_tokens).items())),
+            tuple(sorted(tuple(phrase) for phrase in phrases)),
+            top_k,
+            tuple(sorted(params.items())))
+
+
+class QueryCache:
+
+    def __init__(self, max_entries=MAX_ENTRIES, ttl=TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # clé -> (date d'expiration, classement)
+        self._lock = threading.Lock()
+
+    def _check_version(self, version):
+        # Index reconstruit : les classements enregistrés ne valent plus rien
+        if version != self.version:
+            self._entries.clear()
+            self.version = version
+
+    def get(self, key, version):
+        """Classement enregistré pour la clé (copie de la liste), ou None."""
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(entry[1])
+
+    def put(self, key, version, results):
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = (time.monotonic() + self.ttl, tuple(results))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, key, version, compute):
+        """Classement en cache, sinon compute() (hors verrou : deux requêtes identiques simultanées calculent chacune)."""
+        results = self.get(key, version)
+        if results is None:
+            results = compute()
+            self.put(key, version, results)
+        return results
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries),
+                    "hit_rate": self.hits / lookups if lookups else 0.0, "version": self.version}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_query_cache():
+    """Cache partagé du processus."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = QueryCache()
+    return _cache
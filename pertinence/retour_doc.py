@@ -1,145 +1,60 @@
-import fitz  # PyMuPDF
-import re
+import os
+import sys
 import requests
-from xml.etree import ElementTree as ET
-
-def extract_abstract_preview2(pdf_path, n_words=100):
-    doc = fitz.open(pdf_path)
-    abstract_text = ""
-
-    for page_num in range(min(3, len(doc))):
-        page = doc[page_num]
-        text = page.get_text()
-
-        # Version normalisée : minuscule, espaces multiples remplacés par un seul espace
-        clean_text = re.sub(r'\s+', ' ', text).lower()
-
-        # Cherche "abstract" ou "a b s t r a c t"
-        start_idx = -1
-        if "abstract" in clean_text:
-            start_idx = clean_text.find("abstract")
-        elif "a b s t r a c t" in clean_text:
-            start_idx = clean_text.find("a b s t r a c t")
-
-        if start_idx != -1:
-            # Reprend la même position dans le texte original pour capturer la mise en forme originale
-            original_text = re.sub(r'\s+', ' ', text)
-            abstract_text = original_text[start_idx:].strip()
-            break
-
-    doc.close()
-
-    if not abstract_text:
-        return "Aucun abstract trouvé."
-
-    # Limiter aux 100 premiers mots
-    words = abstract_text.split()
-    first_100_words = ' '.join(words[:n_words]) + ('...' if len(words) > n_words else '')
-
-    return first_100_words
-
-
-def extract_abstract_preview(pmid):
-    url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi"
-    params = {
-        "db": "pubmed",
-        "id": pmid,
-        "retmode": "xml"
-    }
-    response = requests.get(url, params=params)
-    
-    if response.status_code == 200:
-        root = ET.fromstring(response.text)
-        abstract_text = root.find(".//AbstractText")
-        if abstract_text is not None:
-            return abstract_text.text.strip()
-    return "Aucun abstract trouvé."
-
-
-def extract_first_date2(pdf_path):
-    doc = fitz.open(pdf_path)
-    text_all = ""
-    
-    # Parcours des 2 premières pages pour trouver la date
-    for page_num in range(min(2, len(doc))):
-        page = doc[page_num]
-        text_all += page.get_text() + "\n"
-    
-    doc.close()
-
-    # Normaliser le texte
-    text_all_lower = text_all.lower()
-
-    # Mots-clés typiques qui précèdent la date
-    keywords = ["received", "accepted", "published", "available online"]
-    date_regex = r'(\d{1,2}\s+\w+\s+\d{4}|\w+\s+\d{4}|\d{4})'
-    
-    for keyword in keywords:
-        idx = text_all_lower.find(keyword)
-        if idx != -1:
-            snippet = text_all[idx:idx+100]
-            match = re.search(date_regex, snippet)
-            if match:
-                return match.group(0).strip()
-    
-    return "Aucune date trouvée."
-
-
-
-def extract_first_author(pmid):
-    url = f"https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi"
-    params = {
-        "db": "pubmed",
-        "id": pmid,
-        "retmode": "xml"
-    }
-    response = requests.get(url, params=params)
-    
-    if response.status_code == 200:
-        root = ET.fromstring(response.text)
-        author_list = root.find(".//AuthorList")
-        if author_list is not None:
-            first_author = author_list.find("Author")
-            if first_author is not None:
-                last = first_author.find("LastName").text
-                first = first_author.find("ForeName").text
-                return f"{first} {last} et al."
-    return "Auteur non trouvé."
-
-def extract_first_date(pmid):
-    url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi"
-    params = {
-        "db": "pubmed",
-        "id": pmid,
-        "retmode": "xml"
-    }
-    response = requests.get(url, params=params)
-    
-    if response.status_code == 200:
-        root = ET.fromstring(response.text)
-        date_elem = root.find(".//PubDate")
-        if date_elem is not None:
-            # Essaie de trouver l'année complète ou le mois + année
-            year = date_elem.find("Year")
-            month = date_elem.find("Month")
-            if year is not None and month is not None:
-                return f"{month.text} {year.text}"
-            elif year is not None:
-                return year.text
-    return "Aucune date trouvée."
-
-def doc_description(Doc_name):
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from pertinence.pubmed_cache import get_cache, pmid_from_filename, NO_ABSTRACT, NO_AUTHOR, NO_DATE
+from pertinence.pubmed_client import get_client
+
+def doc_description(Doc_name, cache=None, client=None, doc_table=None, deadline=None):
+    # Doc_name : liste classée [(nom_pdf, score), ...] ; description des 5 premiers documents
+    # cache : cache local des métadonnées PubMed (pubmed_cache.py), une seule requête pour les 5 PMID
+    # doc_table : table des documents de l'index {nom_pdf: métadonnées extraites à l'indexation},
+    #             utilisée pour les PMID absents du cache (simple lecture de dictionnaire)
+    # client : client efetch (pubmed_client.py) pour ce qui reste, un seul appel groupé
+    # deadline : échéance (time.monotonic()) de l'appel efetch, délais et nouvelles tentatives compris
+    if cache is None:
+        cache = get_cache()
+    if client is None:
+        client = get_client()
     Doc_score=[]
     for i in range(len(Doc_name)):
         Doc_score.append(Doc_name[i][1])
+    names = [Doc_name[i][0] for i in range(min(5, len(Doc_name)))]
+    pmids = [pmid_from_filename(name) for name in names]
+    cached = cache.get_many(pmids)
+
+    # Description de chaque document : cache PubMed, sinon table de l'index
+    described = {}
+    for name, pmid in zip(names, pmids):
+        if pmid in cached:
+            described[name] = cached[pmid]
+        elif doc_table and name in doc_table:
+            infos = doc_table[name]
+            described[name] = {"abstract": infos.get("abstract", NO_ABSTRACT),
+                               "first_author": infos.get("first_author", NO_AUTHOR),
+                               "pub_date": infos.get("date", NO_DATE)}
+
+    # Le reste : un seul appel efetch groupé puis mise en cache
+    missing = [pmid for name, pmid in zip(names, pmids) if pmid and name not in described]
+    if missing:
+        try:
+            fetched = client.fetch(missing, deadline=deadline)
+        except requests.RequestException:
+            fetched = {}  # pas de réseau : valeurs par défaut, rien n'est mis en cache
+        if fetched:
+            cache.put_many(fetched)
+        for name, pmid in zip(names, pmids):
+            if name not in described and pmid in fetched:
+                described[name] = fetched[pmid]
+
     Doc_author=[]
     Doc_date=[]
     Doc_abstract=[]
-    for i in range(5):
-        pdf_file = "pubmed_articles/" + Doc_name[i][0]
-        Doc_abstract.append(extract_abstract_preview(pdf_file))
-        Doc_date.append(extract_first_date(pdf_file))
-        Doc_author.append(extract_first_author(pdf_file))
+    for name in names:
+        infos = described.get(name, {})
+        Doc_abstract.append(infos.get("abstract", NO_ABSTRACT))
+        Doc_date.append(infos.get("pub_date", NO_DATE))
+        Doc_author.append(infos.get("first_author", NO_AUTHOR))
     return Doc_abstract, Doc_date, Doc_author, Doc_score
 
 def extract_title_from_filename(filename):
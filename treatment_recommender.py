@@ -4,14 +4,80 @@ ESMO Metastatic Breast Cancer Treatment Recommender
 Processes patient JSON through ESMO decision tree guidelines
 """
 
+import argparse
 import json
+import multiprocessing
+import os
 import sys
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, List, Any, Optional, Tuple, Callable, NamedTuple, Iterator
 
 
 #Index inversé
 
 
+# Predicates for guideline conditions, keyed on (category, condition_id).
+# Unknown conditions evaluate to False.
+CONDITION_PREDICATES: Dict[Tuple[str, str], Callable[[Dict], bool]] = {
+    ('diagnosis', 'mbc_diagnosis'):
+        lambda p: p.get('diagnosis', {}).get('stage') == 'metastatic',
+
+    ('biomarker', 'er_positive'):
+        lambda p: p.get('biomarkers', {}).get('ER') == 'positive',
+    ('biomarker', 'her2_negative'):
+        lambda p: p.get('biomarkers', {}).get('HER2') == 'negative',
+    ('biomarker', 'her2_positive'):
+        lambda p: p.get('biomarkers', {}).get('HER2') == 'positive',
+    ('biomarker', 'hr_negative'):
+        lambda p: (p.get('biomarkers', {}).get('ER') == 'negative' and
+                   p.get('biomarkers', {}).get('PgR') == 'negative'),
+    ('biomarker', 'tnbc_status'):
+        lambda p: (p.get('biomarkers', {}).get('ER') == 'negative' and
+                   p.get('biomarkers', {}).get('PgR') == 'negative' and
+                   p.get('biomarkers', {}).get('HER2') == 'negative'),
+    ('biomarker', 'pik3ca_mutation'):
+        lambda p: p.get('biomarkers', {}).get('PIK3CA') == 'mutant',
+    ('biomarker', 'brca_or_palb2'):
+        lambda p: (p.get('biomarkers', {}).get('BRCA1') == 'mutant' or
+                   p.get('biomarkers', {}).get('BRCA2') == 'mutant' or
+                   p.get('biomarkers', {}).get('PALB2') == 'mutant'),
+    ('biomarker', 'esr1_mut'):
+        lambda p: p.get('biomarkers', {}).get('ESR1') == 'mutant',
+    ('biomarker', 'msi_high'):
+        lambda p: p.get('biomarkers', {}).get('MSI') == 'high',
+    ('biomarker', 'ntrk_fusion'):
+        lambda p: p.get('biomarkers', {}).get('NTRK') == 'positive',
+    ('biomarker', 'tmb_high'):
+        lambda p: p.get('biomarkers', {}).get('TMB', 0) >= 10,
+
+    ('treatment_history', 'progressed_on_cdk46'):
+        lambda p: any('CDK4/6' in t.get('regimen', '') and t.get('progression', False)
+                      for t in p.get('treatment_history', [])),
+    ('treatment_history', 'progression_on_first_line'):
+        lambda p: (len(p.get('treatment_history', [])) >= 1 and
+                   any(t.get('progression', False) for t in p.get('treatment_history', []))),
+    ('treatment_history', 'exhausted_standard'):
+        lambda p: len(p.get('treatment_history', [])) >= 2,
+
+    ('lab_value', 'hba1c_ok'):
+        lambda p: p.get('lab_values', {}).get('HbA1c', 10) < 8.0,
+
+    ('contraindication', 'chemo_contraindicated'):
+        lambda p: any('chemotherapy' in c for c in p.get('contraindications', [])),
+}
+
+
+def _always_false(patient: Dict) -> bool:
+    return False
+
+
+class CompiledNode(NamedTuple):
+    """Decision tree node flattened in pre-order; `end` is the index just past its subtree"""
+    node: Dict
+    title: str
+    depth: int
+    end: int
+    conditions: Tuple[Tuple[Tuple[str, str], Callable[[Dict], bool]], ...]
+    drug_actions: Tuple[Tuple[Dict, List[str]], ...]
 
 
 class ESMOTreatmentRecommender:
@@ -21,80 +87,74 @@ class ESMOTreatmentRecommender:
         with open(guidelines_path, 'r') as f:
             self.guidelines = json.load(f)
         self.recommendations = []
+        self.nodes = self.compile_tree(self.guidelines['decision_tree']['root'])
         
-    def evaluate_condition(self, condition: Dict, patient: Dict) -> bool:
-        """Evaluate a single condition against patient data"""
-        condition_id = condition.get('condition_id')
-        category = condition.get('category')
-        expected_value = condition.get('value')
-        operator = condition.get('operator', '=')
-        
-        # Map condition to patient data
-        if category == 'diagnosis':
-            if condition_id == 'mbc_diagnosis':
-                return patient.get('diagnosis', {}).get('stage') == 'metastatic'
-                
-        elif category == 'biomarker':
-            biomarkers = patient.get('biomarkers', {})
-            
-            if condition_id == 'er_positive':
-                return biomarkers.get('ER') == 'positive'
-            elif condition_id == 'her2_negative':
-                return biomarkers.get('HER2') == 'negative'
-            elif condition_id == 'her2_positive':
-                return biomarkers.get('HER2') == 'positive'
-            elif condition_id == 'hr_negative':
-                return (biomarkers.get('ER') == 'negative' and 
-                       biomarkers.get('PgR') == 'negative')
-            elif condition_id == 'tnbc_status':
-                return (biomarkers.get('ER') == 'negative' and 
-                       biomarkers.get('PgR') == 'negative' and
-                       biomarkers.get('HER2') == 'negative')
-            elif condition_id == 'pik3ca_mutation':
-                return biomarkers.get('PIK3CA') == 'mutant'
-            elif condition_id == 'brca_or_palb2':
-                return (biomarkers.get('BRCA1') == 'mutant' or 
-                       biomarkers.get('BRCA2') == 'mutant' or
-                       biomarkers.get('PALB2') == 'mutant')
-            elif condition_id == 'esr1_mut':
-                return biomarkers.get('ESR1') == 'mutant'
-            elif condition_id == 'msi_high':
-                return biomarkers.get('MSI') == 'high'
-            elif condition_id == 'ntrk_fusion':
-                return biomarkers.get('NTRK') == 'positive'
-            elif condition_id == 'tmb_high':
-                return biomarkers.get('TMB', 0) >= 10
-                
-        elif category == 'treatment_history':
-            treatment_history = patient.get('treatment_history', [])
-            
-            if condition_id == 'progressed_on_cdk46':
-                return any('CDK4/6' in t.get('regimen', '') and t.get('progression', False) 
-                          for t in treatment_history)
-            elif condition_id == 'progression_on_first_line':
-                return len(treatment_history) >= 1 and any(t.get('progression', False) 
-                                                          for t in treatment_history)
-            elif condition_id == 'exhausted_standard':
-                return len(treatment_history) >= 2
-                
-        elif category == 'lab_value':
-            lab_values = patient.get('lab_values', {})
-            
-            if condition_id == 'hba1c_ok':
-                return lab_values.get('HbA1c', 10) < 8.0
-                
-        elif category == 'contraindication':
-            contraindications = patient.get('contraindications', [])
-            
-            if condition_id == 'chemo_contraindicated':
-                return any('chemotherapy' in c for c in contraindications)
-        
-        return False
-    
-    def evaluate_conditions(self, conditions: List[Dict], patient: Dict) -> bool:
-        """Evaluate all conditions for a node (AND logic)"""
-        return all(self.evaluate_condition(cond, patient) for cond in conditions)
-    
+    def compile_tree(self, root: Dict) -> List[CompiledNode]:
+        """Flatten the decision tree into a pre-order node table with pre-bound predicates"""
+        nodes: List[CompiledNode] = []
+
+        def visit(node: Dict, depth: int) -> None:
+            position = len(nodes)
+            nodes.append(None)
+            for child in node.get('children', []):
+                visit(child, depth + 1)
+            conditions = tuple(
+                ((c.get('category'), c.get('condition_id')),
+                 CONDITION_PREDICATES.get((c.get('category'), c.get('condition_id')), _always_false))
+                for c in node.get('conditions', [])
+            )
+            drug_actions = ()
+            if node.get('node_type') == 'action':
+                drug_actions = tuple(
+                    (action, self.extract_keywords(action.get('name', '')))
+                    for action in node.get('actions', [])
+                    if action.get('action_type') == 'drug_therapy'
+                )
+            nodes[position] = CompiledNode(node, node.get('title', ''), depth, len(nodes),
+                                           conditions, drug_actions)
+
+        visit(root, 0)
+        return nodes
+
+    def evaluate_tree(self, patient: Dict) -> List[Dict]:
+        """Run the compiled node table for one patient and collect recommendations"""
+        recommendations = []
+        results: Dict[Tuple[str, str], bool] = {}  # each condition evaluated once per patient
+        path: List[str] = []  # titles of the current node's ancestors
+        nodes = self.nodes
+        i = 0
+        while i < len(nodes):
+            compiled = nodes[i]
+            del path[compiled.depth:]
+
+            satisfied = True
+            for key, predicate in compiled.conditions:
+                result = results.get(key)
+                if result is None:
+                    result = results[key] = predicate(patient)
+                if not result:
+                    satisfied = False
+                    break
+            if not satisfied:
+                i = compiled.end  # skip the whole subtree
+                continue
+
+            path.append(compiled.title)
+            if compiled.drug_actions:
+                node_path = ' -> '.join(path)
+                for action, keywords in compiled.drug_actions:
+                    recommendations.append({
+                        'treatment': action.get('name'),
+                        'evidence_level': action.get('evidence_level'),
+                        'recommendation_strength': action.get('recommendation_strength'),
+                        'node_path': node_path,
+                        'rationale': self.generate_rationale(compiled.node, action, patient),
+                        'keywords': list(keywords)
+                    })
+            i += 1
+
+        return recommendations
+
     def get_subtype(self, patient: Dict) -> str:
         """Determine breast cancer subtype"""
         biomarkers = patient.get('biomarkers', {})
@@ -109,38 +169,6 @@ class ESMOTreatmentRecommender:
         else:
             return 'Unknown'
     
-    def traverse_node(self, node: Dict, patient: Dict, path: List[str] = []) -> List[Dict]:
-        """Recursively traverse decision tree and collect recommendations"""
-        recommendations = []
-        
-        # Check if node conditions are met
-        conditions = node.get('conditions', [])
-        if conditions and not self.evaluate_conditions(conditions, patient):
-            return recommendations
-        
-        # If this is an action node, collect the actions
-        if node.get('node_type') == 'action':
-            actions = node.get('actions', [])
-            for action in actions:
-                if action.get('action_type') == 'drug_therapy':
-                    rec = {
-                        'treatment': action.get('name'),
-                        'evidence_level': action.get('evidence_level'),
-                        'recommendation_strength': action.get('recommendation_strength'),
-                        'node_path': ' -> '.join(path + [node.get('title', '')]),
-                        'rationale': self.generate_rationale(node, action, patient),
-                        'keywords': self.extract_keywords(action.get('name', ''))
-                    }
-                    recommendations.append(rec)
-        
-        # Traverse children
-        children = node.get('children', [])
-        for child in children:
-            child_recs = self.traverse_node(child, patient, path + [node.get('title', '')])
-            recommendations.extend(child_recs)
-        
-        return recommendations
-    
     def generate_rationale(self, node: Dict, action: Dict, patient: Dict) -> str:
         """Generate human-readable rationale for treatment recommendation"""
         subtype = self.get_subtype(patient)
@@ -207,14 +235,14 @@ class ESMOTreatmentRecommender:
         
         return list(set(keywords))  # Remove duplicates
     
-    def process_patient(self, patient_path: str) -> Dict:
-        """Process a single patient JSON file"""
-        with open(patient_path, 'r') as f:
-            patient = json.load(f)
+    def process_patient(self, patient: Any) -> Dict:
+        """Process a single patient, given as a dict or as a path to a patient JSON file"""
+        if not isinstance(patient, dict):
+            with open(patient, 'r') as f:
+                patient = json.load(f)
         
-        # Start traversal from root
-        root = self.guidelines['decision_tree']['root']
-        recommendations = self.traverse_node(root, patient)
+        # Run the compiled decision tree
+        recommendations = self.evaluate_tree(patient)
         
         # Add patient summary
         subtype = self.get_subtype(patient)
@@ -290,13 +318,95 @@ class ESMOTreatmentRecommender:
 
 
 
+# Cohort mode: one recommender per worker process, shared across all patients
+
+_worker_recommender: Optional[ESMOTreatmentRecommender] = None
+
+
+def _init_worker(guidelines_path: str) -> None:
+    global _worker_recommender
+    _worker_recommender = ESMOTreatmentRecommender(guidelines_path)
+
+
+def _process_cohort_item(item: Tuple[str, str]) -> str:
+    """Process one ('path', file) or ('line', json_text) item into a JSON Lines record"""
+    kind, value = item
+    try:
+        patient = value if kind == 'path' else json.loads(value)
+        result = _worker_recommender.process_patient(patient)
+    except Exception as e:
+        result = {'source': value if kind == 'path' else value.strip()[:80], 'error': str(e)}
+    return json.dumps(result, ensure_ascii=False)
+
+
+def iter_cohort(source: str) -> Iterator[Tuple[str, str]]:
+    """Yield patients from a directory of JSON files, a JSON Lines file, or '-' for stdin"""
+    if source != '-' and os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            if name.endswith('.json'):
+                yield ('path', os.path.join(source, name))
+        return
+    stream = sys.stdin if source == '-' else open(source, 'r', encoding='utf-8')
+    try:
+        for line in stream:
+            if line.strip():
+                yield ('line', line)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def run_cohort(guidelines_path: str, source: str, output: str = '-',
+               workers: Optional[int] = None, chunksize: int = 64) -> int:
+    """Stream recommendations for a whole cohort as JSON Lines; returns the number of patients"""
+    out = sys.stdout if output == '-' else open(output, 'w', encoding='utf-8')
+    count = 0
+    try:
+        if workers == 1:
+            _init_worker(guidelines_path)
+            for line in map(_process_cohort_item, iter_cohort(source)):
+                out.write(line + '\n')
+                count += 1
+        else:
+            with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(guidelines_path,)) as pool:
+                for line in pool.imap(_process_cohort_item, iter_cohort(source), chunksize=chunksize):
+                    out.write(line + '\n')
+                    count += 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return count
+
+
 def main():
-    if len(sys.argv) != 3:
-        print("Usage: python treatment_recommender.py <guidelines.json> <patient.json>")
+    parser = argparse.ArgumentParser(
+        description="ESMO metastatic breast cancer treatment recommender",
+        usage="python treatment_recommender.py <guidelines.json> <patient.json>\n"
+              "       python treatment_recommender.py <guidelines.json> --cohort <dir|patients.jsonl|-> "
+              "[--output results.jsonl] [--workers N]")
+    parser.add_argument('guidelines')
+    parser.add_argument('patient', nargs='?')
+    parser.add_argument('--cohort', help="directory of patient JSON files, JSON Lines file, or '-' for stdin")
+    parser.add_argument('--output', default='-', help="JSON Lines output file (default: stdout)")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    if bool(args.patient) == bool(args.cohort):
+        parser.print_usage()
         sys.exit(1)
-    
-    guidelines_file = sys.argv[1]
-    patient_file = sys.argv[2]
+
+    guidelines_file = args.guidelines
+
+    if args.cohort:
+        try:
+            count = run_cohort(guidelines_file, args.cohort, args.output, args.workers)
+        except FileNotFoundError as e:
+            print(f"Error: File not found - {e}", file=sys.stderr)
+            sys.exit(1)
+        print(f"Processed {count} patient(s)", file=sys.stderr)
+        return
+
+    patient_file = args.patient
     
     try:
         # Initialize recommender